@@ -25,3 +25,78 @@ class SceneBuilderApp(sgtk.platform.Application):
         self.engine.register_command(
             "Scene Builder...", cb, {"short_name": "scene_builder"}
         )
+
+        # the batch builder is created on demand and reused between the builds
+        self._batch_builder = None
+
+        # incremented every time the engine changes its context, for example when opening another scene, so the
+        # scene scans cached by the open dialogs can be invalidated
+        self.context_change_count = 0
+
+    def post_context_change(self, old_context, new_context):
+        """
+        Called by the engine once its context has changed, for example after another scene has been opened.
+
+        :param old_context: The previous context
+        :param new_context: The new context
+        """
+        self.context_change_count += 1
+
+    def build_from_preset(self, preset_name, context=None, dry_run=False):
+        """
+        Build the current scene according to a preset without showing any UI.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together
+        :param context:     The context used to resolve the preset filters. If None, the current context is used.
+        :param dry_run:     If True, only report what would be done, without modifying the scene
+        :returns: A dictionary reporting what has been done
+        """
+        return self._get_batch_builder().build_from_preset(
+            preset_name, context, dry_run
+        )
+
+    def build_contexts_from_preset(
+        self, preset_name, contexts, dry_run=False, callback=None
+    ):
+        """
+        Build a scene for each of the given contexts, one after the other, without showing any UI.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together
+        :param contexts:    List of contexts to build
+        :param dry_run:     If True, only report what would be done, without modifying the scenes
+        :param callback:    Optional callable run after each build with the context and the build report, for example
+                            to save the scene and reset it before building the next context
+        :returns: The list of build reports, one per context
+        """
+        return self._get_batch_builder().build_contexts(
+            preset_name, contexts, dry_run, callback
+        )
+
+    def compute_build_plan(self, preset_name, context=None):
+        """
+        Compute the operations needed to build the current scene according to a preset, without modifying the scene.
+        The plan can be exported as JSON for review using its ``to_json`` method, loaded back using
+        ``BuildPlan.from_json`` and executed using :meth:`execute_build_plan`.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together
+        :param context:     The context used to resolve the preset filters. If None, the current context is used.
+        :returns: A ``BuildPlan`` instance
+        """
+        return self._get_batch_builder().compute_plan(preset_name, context)
+
+    def execute_build_plan(self, plan, dry_run=False):
+        """
+        Build the current scene according to a build plan without showing any UI.
+
+        :param plan:    The ``BuildPlan`` to execute, as returned by :meth:`compute_build_plan`
+        :param dry_run: If True, only report what would be done, without modifying the scene
+        :returns: A dictionary reporting what has been done
+        """
+        return self._get_batch_builder().execute_plan(plan, dry_run)
+
+    def _get_batch_builder(self):
+        """Get the batch builder, creating it on the first call"""
+        if not self._batch_builder:
+            tk_multi_scenebuilder = self.import_module("tk_multi_scenebuilder")
+            self._batch_builder = tk_multi_scenebuilder.BatchBuilder(self)
+        return self._batch_builder
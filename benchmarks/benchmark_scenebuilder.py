@@ -0,0 +1,868 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Offline benchmarks for the Scene Builder.
+
+The benchmarks run against an in-memory PTR stand-in and fake loader and breakdown managers populated with a
+synthetic project, so they don't need any network access, PTR site or DCC. They only need tk-core to be importable
+(add its ``python`` folder to the ``PYTHONPATH``) and, for the model benchmarks, PySide2 or PySide6.
+
+Usage::
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/benchmark_scenebuilder.py \\
+        --sizes 1000 10000 100000 --history 5 --scene-refs 200 --output results.json
+
+    # compare the results with the ones of a previous release
+    python benchmarks/benchmark_scenebuilder.py --output new.json --compare old.json
+
+The following scenarios are measured for each project size:
+
+- ``model_load``: time between :meth:`FileModel.load_data` and the ``data_loaded`` signal, time spent grouping the
+  published files into the model items, peak memory allocated by Python during the load, and memory still held
+  once the model is built, in total and per row.
+- ``model_scroll``: frames per second when scrolling the loaded model page by page in a view using the file delegate
+  and the thumbnail loader, the thumbnails being "downloaded" as soon as they're requested.
+- ``build_plan``: time needed to query the published files and compute the status of every file without Qt, as
+  done by the batch builder in dry-run mode.
+- ``build``: time needed to build the scene with the batch builder, reported per loaded or updated file.
+
+The scenarios are run in latest versions only mode as well for the project sizes given with ``--latest-sizes``, small
+ones by default as the PTR stand-in is slow to evaluate the latest versions filters.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from tk_multi_scenebuilder.query import match_filters
+
+logger = logging.getLogger("scenebuilder.benchmarks")
+
+PUBLISHED_FILE_TYPES = ["Maya Scene", "Alembic Cache", "Image"]
+
+ACTION_MAPPINGS = {
+    "Maya Scene": "reference",
+    "Alembic Cache": "reference",
+    "Image": "texture_node",
+}
+
+# fields returned by the PTR stand-in, similar to the ones requested by the loader
+PUBLISHED_FILES_FIELDS = [
+    "id",
+    "type",
+    "code",
+    "name",
+    "project",
+    "entity",
+    "task",
+    "version_number",
+    "published_file_type",
+    "path",
+    "image",
+    "description",
+    "created_by",
+    "created_at",
+    "updated_at",
+]
+
+
+################################################################################################
+# synthetic data
+
+
+def generate_project(publish_count, history_depth, scene_refs, seed=0):
+    """
+    Generate a synthetic project.
+
+    :param publish_count: Number of published files to generate, including all the versions
+    :param history_depth: Number of versions of each published file
+    :param scene_refs:    Number of published files loaded in the scene. Some of them are loaded in an old version
+                          and a few of them aren't part of the preset anymore.
+    :param seed:          Seed of the random generator, so the same project is generated on every run
+    :returns: A (published files, scene published files) tuple
+    """
+
+    rng = random.Random(seed)
+    base_date = datetime.datetime(2021, 1, 1)
+
+    publishes = []
+    publish_id = 1
+    file_count = max(1, publish_count // history_depth)
+    for file_index in range(file_count):
+        asset_id = file_index // 10 + 1
+        publish_type = PUBLISHED_FILE_TYPES[file_index % len(PUBLISHED_FILE_TYPES)]
+        for version in range(1, history_depth + 1):
+            updated_at = base_date + datetime.timedelta(minutes=publish_id)
+            publishes.append(
+                {
+                    "id": publish_id,
+                    "type": "PublishedFile",
+                    "code": "file_%d.v%03d" % (file_index, version),
+                    "name": "file_%d" % file_index,
+                    "project": FakeContext.project,
+                    "entity": {
+                        "type": "Asset",
+                        "id": asset_id,
+                        "name": "asset_%d" % asset_id,
+                    },
+                    "task": {"type": "Task", "id": asset_id, "name": "model"},
+                    "version_number": version,
+                    "published_file_type": {
+                        "type": "PublishedFileType",
+                        "id": PUBLISHED_FILE_TYPES.index(publish_type) + 1,
+                        "name": publish_type,
+                    },
+                    "path": {
+                        "local_path": "/tmp/file_%d.v%03d" % (file_index, version)
+                    },
+                    "image": "https://localhost/thumbnails/%d.png" % publish_id,
+                    "description": "Synthetic published file",
+                    "created_by": {"type": "HumanUser", "id": 1, "name": "Bench"},
+                    "created_at": updated_at,
+                    "updated_at": updated_at,
+                }
+            )
+            publish_id += 1
+
+    # load some of the files in the scene, a third of them in an old version
+    scene_publishes = []
+    for file_index in rng.sample(range(file_count), min(scene_refs, file_count)):
+        version = history_depth
+        if history_depth > 1 and rng.random() < 0.33:
+            version = rng.randint(1, history_depth - 1)
+        scene_publishes.append(publishes[file_index * history_depth + version - 1])
+
+    # and a few files which aren't part of the project anymore
+    for orphan_index in range(max(1, scene_refs // 20)):
+        orphan = dict(publishes[0])
+        orphan["id"] = publish_id + orphan_index
+        orphan["name"] = "orphan_%d" % orphan_index
+        scene_publishes.append(orphan)
+
+    return publishes, scene_publishes
+
+
+################################################################################################
+# stand-ins
+
+
+class MockShotgun(object):
+    """
+    In-memory PTR stand-in, evaluating the filters of the queries against the synthetic published files. It only
+    supports the features used by the Scene Builder.
+    """
+
+    def __init__(self, publishes):
+        self._entities = {
+            "PublishedFile": publishes,
+            "PublishedFileType": [
+                {"type": "PublishedFileType", "id": i + 1, "code": code}
+                for i, code in enumerate(PUBLISHED_FILE_TYPES)
+            ],
+        }
+        self._publishes = publishes
+        self.query_count = 0
+
+    def find(self, entity_type, filters, fields=None, order=None, **kwargs):
+        self.query_count += 1
+        publishes = [
+            p for p in self._entities[entity_type] if match_filters(p, filters)
+        ]
+        for o in reversed(order or []):
+            publishes.sort(
+                key=lambda p: p.get(o["field_name"]) or 0,
+                reverse=o.get("direction") == "desc",
+            )
+        fields = set(fields or []) | set(["id", "type"])
+        return [dict((k, v) for k, v in p.items() if k in fields) for p in publishes]
+
+    def summarize(self, entity_type, filters, summary_fields, grouping=None, **kwargs):
+        self.query_count += 1
+        if not grouping:
+            return {
+                "summaries": self._summarize(
+                    [p for p in self._publishes if match_filters(p, filters)],
+                    summary_fields,
+                ),
+                "groups": [],
+            }
+
+        groups = {}
+        for p in self._publishes:
+            if match_filters(p, filters):
+                groups.setdefault(
+                    tuple(_freeze(p.get(g["field"])) for g in grouping), []
+                ).append(p)
+
+        # rebuild the nested groups returned by PTR, one level per grouping field
+        root = {"groups": []}
+        nested_groups = {}
+        for values, publishes in sorted(groups.items(), key=lambda g: str(g[0])):
+            parent = root
+            for depth in range(1, len(values) + 1):
+                group = nested_groups.get(values[:depth])
+                if not group:
+                    value = values[depth - 1]
+                    group = {
+                        "group_value": (
+                            dict(value) if isinstance(value, tuple) else value
+                        ),
+                        "groups": [],
+                    }
+                    parent["groups"].append(group)
+                    nested_groups[values[:depth]] = group
+                parent = group
+            parent["summaries"] = self._summarize(publishes, summary_fields)
+        return root
+
+    def _summarize(self, publishes, summary_fields):
+        summaries = {}
+        for summary_field in summary_fields:
+            values = [p.get(summary_field["field"]) for p in publishes]
+            if summary_field["type"] == "count":
+                summaries[summary_field["field"]] = len(values)
+            else:
+                summaries[summary_field["field"]] = max(values) if values else None
+        return summaries
+
+
+def _freeze(value):
+    """Make a PTR value hashable"""
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    return value
+
+
+class SceneObject(object):
+    """Stand-in for the objects returned by the breakdown manager"""
+
+    def __init__(self, sg_data):
+        self.sg_data = sg_data
+        self.latest_published_file = None
+
+
+class FakeBreakdownManager(object):
+    """Breakdown manager stand-in, keeping the scene in memory"""
+
+    def __init__(self, scene_publishes):
+        self.scene = [SceneObject(p) for p in scene_publishes]
+
+    def scan_scene(self):
+        return [SceneObject(obj.sg_data) for obj in self.scene]
+
+    def update_to_latest_version(self, obj):
+        for scene_obj in self.scene:
+            if scene_obj.sg_data["id"] == obj.sg_data["id"]:
+                scene_obj.sg_data = obj.latest_published_file
+        obj.sg_data = obj.latest_published_file
+
+
+class FakeLoaderManager(object):
+    """Loader manager stand-in, adding the loaded files to the fake scene"""
+
+    UI_AREA_MAIN = "main"
+
+    def __init__(self, breakdown_manager):
+        self._breakdown_manager = breakdown_manager
+
+    def get_actions_for_publish(self, sg_data, ui_area):
+        return [
+            {"name": name, "params": None, "caption": name, "description": ""}
+            for name in sorted(set(ACTION_MAPPINGS.values()))
+        ]
+
+    def execute_multiple_actions(self, actions):
+        for action in actions:
+            self._breakdown_manager.scene.append(SceneObject(action["sg_publish_data"]))
+
+
+class FakeLoaderApp(object):
+    """Loader application stand-in"""
+
+    class _Constants(object):
+        PUBLISHED_FILES_FIELDS = PUBLISHED_FILES_FIELDS
+
+    def __init__(self, breakdown_manager):
+        self._loader_manager = FakeLoaderManager(breakdown_manager)
+
+    def create_loader_manager(self):
+        return self._loader_manager
+
+    def import_module(self, name):
+        return self._Constants
+
+
+class FakeBreakdownApp(object):
+    """Breakdown application stand-in"""
+
+    def __init__(self, breakdown_manager):
+        self._breakdown_manager = breakdown_manager
+
+    def create_breakdown_manager(self):
+        return self._breakdown_manager
+
+
+class FakeContext(object):
+    """Context stand-in, only providing the fields used to resolve the preset filters"""
+
+    project = {"type": "Project", "id": 1, "name": "Benchmark"}
+    entity = None
+    step = None
+    task = None
+
+    def __str__(self):
+        return "Benchmark"
+
+
+class FakeApp(object):
+    """Scene Builder application stand-in"""
+
+    def __init__(self, publishes, scene_publishes, settings):
+        self.shotgun = MockShotgun(publishes)
+        self.context = FakeContext()
+        self.logger = logger
+        self.cache_location = tempfile.mkdtemp(prefix="scenebuilder_benchmark_")
+        self.context_change_count = 0
+        self.breakdown_manager = FakeBreakdownManager(scene_publishes)
+        self.loader_app = FakeLoaderApp(self.breakdown_manager)
+        self.engine = mock.Mock()
+        self.engine.apps = {
+            "tk-multi-loader2": self.loader_app,
+            "tk-multi-breakdown2": FakeBreakdownApp(self.breakdown_manager),
+        }
+        self._settings = settings
+
+    def get_setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+    def execute_hook_method(self, hook_name, method_name, **kwargs):
+        return None
+
+
+def create_settings(latest_versions_only=False):
+    """Get the app settings used by the benchmarks"""
+    return {
+        "presets": [
+            {
+                "name": "Benchmark",
+                "actions": [
+                    {
+                        "context": [["project", "is", "{context.project}"]],
+                        "action_mappings": ACTION_MAPPINGS,
+                    }
+                ],
+            }
+        ],
+        "latest_versions_only": latest_versions_only,
+        "query_cache_max_size": 0,
+        "model_update_budget": 20,
+        "thumbnail_prefetch_rows": 20,
+    }
+
+
+################################################################################################
+# benchmarks
+
+
+def measure(callback):
+    """
+    Run a callable, measuring its duration and the peak memory allocated by Python while it runs.
+
+    :returns: A (result, duration in seconds, peak memory in MB) tuple
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        result = callback()
+        duration = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, duration, peak / (1024.0 * 1024.0)
+
+
+def benchmark_build(app):
+    """Measure the time needed to compute the build plan and to build the scene with the batch builder"""
+
+    from tk_multi_scenebuilder.batch import BatchBuilder
+
+    with mock.patch("sgtk.platform.current_bundle", return_value=app):
+        builder = BatchBuilder(app)
+        report, plan_duration, plan_memory = measure(
+            lambda: builder.build_from_preset("Benchmark", dry_run=True)
+        )
+        results = [
+            {
+                "scenario": "build_plan",
+                "queries": app.shotgun.query_count,
+                "duration": plan_duration,
+                "peak_memory_mb": plan_memory,
+                "to_load": len(report["loaded"]),
+                "to_update": len(report["updated"]),
+                "up_to_date": report["up_to_date"],
+                "missing": len(report["missing"]),
+            }
+        ]
+
+        report, build_duration, build_memory = measure(
+            lambda: builder.build_from_preset("Benchmark")
+        )
+        item_count = len(report["loaded"]) + len(report["updated"])
+        results.append(
+            {
+                "scenario": "build",
+                "duration": build_duration,
+                "peak_memory_mb": build_memory,
+                "items": item_count,
+                "failed": len(report["failed"]),
+                "duration_per_item": build_duration / item_count if item_count else 0.0,
+            }
+        )
+
+        # the first build after the scene has changed computes a new plan, the following ones reuse it as long as
+        # neither the scene nor the published files change
+        builder.build_from_preset("Benchmark", dry_run=True)
+        query_count = app.shotgun.query_count
+        report, rebuild_duration, rebuild_memory = measure(
+            lambda: builder.build_from_preset("Benchmark", dry_run=True)
+        )
+        results.append(
+            {
+                "scenario": "cached_build_plan",
+                "queries": app.shotgun.query_count - query_count,
+                "duration": rebuild_duration,
+                "peak_memory_mb": rebuild_memory,
+                "plan_cached": report["plan_cached"],
+                "scene_up_to_date": report["scene_up_to_date"],
+            }
+        )
+    return results
+
+
+def benchmark_model_load(app):
+    """
+    Measure the time needed by the :class:`FileModel` to load a preset, from the call to
+    :meth:`FileModel.load_data` to the ``data_loaded`` signal, running a real Qt event loop, and the frame rate when
+    scrolling the loaded files in a view.
+    """
+
+    from sgtk.util.qt_importer import QtImporter
+
+    qt = QtImporter()
+    if not qt.QtCore:
+        raise RuntimeError("PySide2 or PySide6 is needed to run the model benchmarks")
+    QtCore, QtGui = qt.QtCore, qt.QtGui
+    qt_app = QtGui.QApplication.instance() or QtGui.QApplication([])
+
+    # all the thumbnails use the same image
+    thumb_path = os.path.join(app.cache_location, "thumbnail.png")
+    thumbnail = QtGui.QPixmap(150, 80)
+    thumbnail.fill(QtGui.QColor("#18A7E3"))
+    thumbnail.save(thumb_path)
+
+    class FakeDataRetriever(QtCore.QObject):
+        """Data retriever stand-in, running the queries in the main thread once the events are processed"""
+
+        work_completed = QtCore.Signal(str, str, dict)
+        work_failure = QtCore.Signal(str, str)
+        thumbnail_count = 0
+
+        def __init__(self, parent=None, bg_task_manager=None):
+            QtCore.QObject.__init__(self, parent)
+            self._uid = 0
+            self._stopped = set()
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def stop_work(self, uid):
+            self._stopped.add(uid)
+
+        def execute_find(self, *args, **kwargs):
+            return self._run("find", app.shotgun.find, *args, **kwargs)
+
+        def execute_method(self, method, *args, **kwargs):
+            return self._run("method", method, app.shotgun, *args, **kwargs)
+
+        def request_thumbnail(self, *args, **kwargs):
+            FakeDataRetriever.thumbnail_count += 1
+            return self._run(
+                "download_thumbnail", lambda: None, result={"thumb_path": thumb_path}
+            )
+
+        def _run(self, request_type, method, *args, result=None, **kwargs):
+            self._uid += 1
+            uid = str(self._uid)
+
+            def run():
+                if uid not in self._stopped:
+                    # the real data retriever stores the result of the methods under another key than the queries
+                    key = "return_value" if request_type == "method" else "sg"
+                    data = {key: method(*args, **kwargs)}
+                    data.update(result or {})
+                    self.work_completed.emit(uid, request_type, data)
+
+            QtCore.QTimer.singleShot(0, run)
+            return uid
+
+    class FakeViewItemDelegate(QtGui.QStyledItemDelegate):
+        """
+        Delegate stand-in, querying the same data as the qtwidgets delegate on each paint: the text rendered as
+        HTML, the thumbnail and the data of the actions.
+        """
+
+        LEFT = 0
+
+        def __init__(self, view):
+            QtGui.QStyledItemDelegate.__init__(self, view)
+            self._view = view
+            self._actions = []
+            self._document = QtGui.QTextDocument()
+            self.text_role = QtCore.Qt.DisplayRole
+
+        def add_actions(self, actions, position=None):
+            self._actions.extend(actions)
+
+        def sizeHint(self, option, index):
+            return QtCore.QSize(400, 80)
+
+        def paint(self, painter, option, index):
+            for action in self._actions:
+                action["get_data"](self._view, index)
+            icon = index.data(QtCore.Qt.DecorationRole)
+            if icon:
+                icon.paint(painter, option.rect.adjusted(0, 0, -250, 0))
+            painter.save()
+            painter.translate(option.rect.left() + 150, option.rect.top())
+            self._document.setHtml(index.data(self.text_role) or "")
+            self._document.drawContents(painter)
+            painter.restore()
+
+    frameworks = {
+        "shotgun_data": mock.Mock(ShotgunDataRetriever=FakeDataRetriever),
+        "delegates": mock.Mock(
+            ViewItemRolesMixin=_ViewItemRolesMixin,
+            ViewItemDelegate=FakeViewItemDelegate,
+            ViewItemAction=mock.Mock(TYPE_CHECK_BOX=0),
+        ),
+    }
+
+    with mock.patch.multiple(
+        "sgtk.platform",
+        current_bundle=mock.Mock(return_value=app),
+        import_framework=lambda name, module: frameworks[module],
+    ), mock.patch.multiple("sgtk.platform.qt", QtCore=QtCore, QtGui=QtGui):
+
+        for module in ["model", "delegate", "filter_model", "thumbnail_loader"]:
+            sys.modules.pop("tk_multi_scenebuilder.%s" % module, None)
+        from tk_multi_scenebuilder.delegate import create_file_delegate
+        from tk_multi_scenebuilder.filter_model import FileFilterProxyModel
+        from tk_multi_scenebuilder.model import FileModel
+        from tk_multi_scenebuilder.thumbnail_loader import ThumbnailLoader
+
+        class BenchmarkFileModel(FileModel):
+            """File model keeping track of the time spent grouping the published files"""
+
+            grouping_duration = 0.0
+
+            def _process_ingestion_jobs(self):
+                start_time = time.perf_counter()
+                FileModel._process_ingestion_jobs(self)
+                self.grouping_duration += time.perf_counter() - start_time
+
+        model = BenchmarkFileModel(
+            None,
+            bg_task_manager=None,
+            loader_app=app.loader_app,
+            breakdown_manager=app.breakdown_manager,
+        )
+
+        def load():
+            loop = QtCore.QEventLoop()
+            model.data_loaded.connect(loop.quit)
+            QtCore.QTimer.singleShot(0, lambda: model.load_data("Benchmark"))
+            loop.exec_()
+            rows = sum(
+                model.rowCount(model.index(r, 0)) for r in range(model.rowCount())
+            )
+            # the memory still allocated once the load is done is mostly held by the model
+            retained_memory, _ = tracemalloc.get_traced_memory()
+            return rows, retained_memory / (1024.0 * 1024.0)
+
+        (rows, retained_memory), duration, memory = measure(load)
+        result = {
+            "scenario": "model_load",
+            "duration": duration,
+            "grouping_duration": model.grouping_duration,
+            "peak_memory_mb": memory,
+            "retained_memory_mb": retained_memory,
+            "rows": rows,
+            "duration_per_row": duration / rows if rows else 0.0,
+            "memory_per_row_kb": retained_memory * 1024.0 / rows if rows else 0.0,
+        }
+
+        # display the files the same way the dialog does
+        view = QtGui.QTreeView()
+        view.setHeaderHidden(True)
+        view.setUniformRowHeights(True)
+        proxy_model = FileFilterProxyModel(view)
+        proxy_model.setSourceModel(model)
+        view.setModel(proxy_model)
+        view.setItemDelegate(create_file_delegate(view))
+        ThumbnailLoader(view, model)
+        view.resize(800, 600)
+        view.expandAll()
+        view.show()
+        qt_app.processEvents()
+
+        def scroll():
+            # each frame scrolls one page down, paints the view and processes the thumbnail requests
+            scroll_bar = view.verticalScrollBar()
+            frames = 0
+            for value in range(
+                scroll_bar.minimum(),
+                scroll_bar.maximum() + 1,
+                max(1, scroll_bar.pageStep()),
+            ):
+                scroll_bar.setValue(value)
+                view.viewport().repaint()
+                qt_app.processEvents()
+                frames += 1
+            return frames
+
+        thumbnail_count = FakeDataRetriever.thumbnail_count
+        frames, scroll_duration, scroll_memory = measure(scroll)
+        scroll_result = {
+            "scenario": "model_scroll",
+            "duration": scroll_duration,
+            "peak_memory_mb": scroll_memory,
+            "rows": rows,
+            "frames": frames,
+            "fps": frames / scroll_duration if scroll_duration else 0.0,
+            "thumbnails_requested": FakeDataRetriever.thumbnail_count - thumbnail_count,
+        }
+
+        # the view and its delegate are deleted before the model they use
+        view.close()
+        view.deleteLater()
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+        model.destroy()
+
+    qt_app.processEvents()
+    return [result, scroll_result]
+
+
+class _ViewItemRolesMixin(object):
+    """Stand-in for the qtwidgets framework mixin, only reserving the roles"""
+
+    def initialize_roles(self, next_available_role):
+        return next_available_role + 32
+
+
+def run_benchmarks(
+    sizes,
+    history_depth,
+    scene_refs,
+    latest_versions_only,
+    repeat,
+    skip_model,
+    latest_sizes=(),
+):
+    """
+    Run all the benchmarks for each project size, keeping the fastest run of each scenario.
+
+    :param latest_sizes: Project sizes for which the scenarios are also run in latest versions only mode
+    :returns: The list of results
+    """
+
+    results = []
+    for size in sizes:
+        publishes, scene_publishes = generate_project(size, history_depth, scene_refs)
+        modes = [latest_versions_only]
+        if size in latest_sizes and not latest_versions_only:
+            modes.append(True)
+
+        for mode in modes:
+            best = {}
+            for _ in range(repeat):
+                scenarios = []
+                if not skip_model:
+                    app = FakeApp(publishes, scene_publishes, create_settings(mode))
+                    scenarios += benchmark_model_load(app)
+                # the build modifies the scene, a new app is created so each run starts from the same scene
+                app = FakeApp(publishes, scene_publishes, create_settings(mode))
+                scenarios += benchmark_build(app)
+                for result in scenarios:
+                    previous = best.get(result["scenario"])
+                    if not previous or result["duration"] < previous["duration"]:
+                        best[result["scenario"]] = result
+
+            for result in best.values():
+                result.update(
+                    {
+                        "publishes": len(publishes),
+                        "history_depth": history_depth,
+                        "scene_refs": len(scene_publishes),
+                        "latest_versions_only": mode,
+                    }
+                )
+                results.append(result)
+                print(
+                    "%-12s %8d publishes%s: %8.3fs %8.1fMB"
+                    % (
+                        result["scenario"],
+                        size,
+                        " (latest only)" if mode else "",
+                        result["duration"],
+                        result["peak_memory_mb"],
+                    )
+                )
+    return results
+
+
+def compare_results(results, baseline_path):
+    """Print the duration and memory ratios between the results and a previous run"""
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    def key(r):
+        return (
+            r["scenario"],
+            r["publishes"],
+            r["history_depth"],
+            r["scene_refs"],
+            r["latest_versions_only"],
+        )
+
+    baseline = dict((key(r), r) for r in baseline)
+    print("\nComparison with %s:" % baseline_path)
+    for result in results:
+        previous = baseline.get(key(result))
+        if not previous:
+            continue
+        print(
+            "%-12s %8d publishes: duration x%.2f, memory x%.2f"
+            % (
+                result["scenario"],
+                result["publishes"],
+                (
+                    result["duration"] / previous["duration"]
+                    if previous["duration"]
+                    else 0
+                ),
+                (
+                    result["peak_memory_mb"] / previous["peak_memory_mb"]
+                    if previous["peak_memory_mb"]
+                    else 0
+                ),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Numbers of published files to generate",
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=5,
+        help="Number of versions of each published file",
+    )
+    parser.add_argument(
+        "--scene-refs",
+        type=int,
+        default=200,
+        help="Number of published files loaded in the scene",
+    )
+    parser.add_argument(
+        "--latest-versions-only",
+        action="store_true",
+        help="Only query the latest versions. This is slow with big projects, as the PTR stand-in evaluates the "
+        "batched latest version filters in Python.",
+    )
+    parser.add_argument(
+        "--latest-sizes",
+        type=int,
+        nargs="*",
+        default=[1000],
+        help="Numbers of published files for which the latest versions only mode is benchmarked as well",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of runs, the fastest one is kept"
+    )
+    parser.add_argument(
+        "--skip-model", action="store_true", help="Skip the benchmarks needing Qt"
+    )
+    parser.add_argument(
+        "--output", help="Path to the JSON file to write the results to"
+    )
+    parser.add_argument(
+        "--compare", help="Path to the JSON results of a previous run to compare with"
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.sizes,
+        args.history,
+        args.scene_refs,
+        args.latest_versions_only,
+        args.repeat,
+        args.skip_model,
+        args.latest_sizes,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "metadata": {
+                        "date": datetime.datetime.now().isoformat(),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "arguments": vars(args),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+
+class Metrics(HookBaseClass):
+
+    ##############################################################################################################
+    # public interface - to be overridden by deriving classes
+
+    def is_enabled(self):
+        """
+        This method is called once when the app starts loading or building, to know if the timings should be sent
+        to this hook. The timings are only measured if this method returns True or if the debug logging is enabled.
+
+        :returns: True if :meth:`record_span` should be called, False otherwise
+        """
+        return False
+
+    def record_span(self, name, duration, counts):
+        """
+        This method is called each time a phase of the load or build process has been timed, for example to send the
+        timings to a telemetry service.
+
+        :param name:     Name of the timed phase, for example *scan_scene*, *ptr_query*, *grouping*, *load*, one of the
+                         kinds of build steps like *loader_actions* or *breakdown_updates*, or *build*
+        :param duration: Duration of the phase, in seconds
+        :param counts:   Dictionary of counts associated to the phase, like the number of published files fetched
+                         (*rows_fetched*), the number of items kept in the model (*rows_kept*) or the number of
+                         thumbnails requested (*thumbnails_requested*). The build steps report the number of steps
+                         of their kind which have been executed (*executed*) and which have failed (*failed*), for
+                         example the number of loader actions, while the whole build reports the number of files
+                         built (*items_built*) and failed (*items_failed*).
+        """
+        pass
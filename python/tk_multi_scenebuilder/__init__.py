@@ -8,6 +8,9 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+from .batch import BatchBuilder
+from .builder import BuildPlan
+
 
 def show_dialog(app):
     """
@@ -0,0 +1,382 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sqlite3
+import time
+
+import sgtk
+
+from .builder import (
+    STATUS_NOT_LOADED,
+    STATUS_OUTDATED,
+    BuildPlan,
+    compute_build_plan,
+    compute_plan_signature,
+    fetch_publishes,
+    resolve_loader_action,
+    update_to_latest_versions,
+)
+from .cache import QueryCache, get_cache_key
+from .query import (
+    PUBLISH_LIST_FIELDS,
+    PresetCompiler,
+    find_latest_publishes,
+    summarize_query,
+)
+from .scene_index import LoadedPublish, SceneIndex
+from .utils import combine_presets, get_preset_name
+
+
+class BatchBuilder(object):
+    """
+    Build scenes from a preset without any UI, for example from a farm job.
+
+    The same builder can be used to build several contexts in a row: the PTR connection, the loader and breakdown
+    managers and the resolved loader actions are reused from one build to the next.
+
+    The build plans are stored along with the signature of their inputs: the scene content, the preset queries and
+    a summary of their results. As long as the signature doesn't change, the stored plan is reused without running
+    the preset queries, and a build with nothing to do returns straight away.
+    """
+
+    def __init__(self, app):
+        """
+        Class constructor.
+
+        :param app: The Scene Builder application instance
+        """
+
+        self._app = app
+
+        loader_app = app.engine.apps.get("tk-multi-loader2")
+        if not loader_app:
+            raise sgtk.TankError(
+                "Please make sure the Loader App is configured for this context."
+            )
+        self._loader_manager = loader_app.create_loader_manager()
+
+        breakdown_app = app.engine.apps.get("tk-multi-breakdown2")
+        if not breakdown_app:
+            raise sgtk.TankError(
+                "Please make sure the Breakdown2 App is configured for this context."
+            )
+        self._breakdown_manager = breakdown_app.create_breakdown_manager()
+
+        # the presets are compiled once per context and reused from one build to the next. Only the fields needed to
+        # compute the build plan are queried, the PTR fields needed by the loader application to perform its actions
+        # are fetched afterwards for the files to build.
+        self._compiler = PresetCompiler(
+            app.get_setting("presets"),
+            PUBLISH_LIST_FIELDS,
+            [{"field_name": "version_number", "direction": "desc"}],
+            logger=app.logger,
+        )
+        self._build_fields = loader_app.import_module(
+            "tk_multi_loader.constants"
+        ).PUBLISHED_FILES_FIELDS + ["published_file_type", "updated_at"]
+        self._action_cache = {}
+
+        # the build plans are kept in memory, and on disk if the query cache is enabled so they can be reused by the
+        # next sessions
+        self._plans = {}
+        self._plan_cache = None
+        cache_max_size = app.get_setting("query_cache_max_size")
+        if cache_max_size:
+            cache_path = os.path.join(app.cache_location, "build_plans.db")
+            try:
+                self._plan_cache = QueryCache(cache_path, cache_max_size * 1024 * 1024)
+            except (OSError, sqlite3.Error) as e:
+                app.logger.warning(
+                    "Scene Builder: Couldn't open build plan cache %s: %s"
+                    % (cache_path, e)
+                )
+
+    def build_from_preset(self, preset_name, context=None, dry_run=False):
+        """
+        Build the current scene according to a preset: the files which aren't loaded yet are loaded, the
+        out-of-date ones are updated and the missing ones are passed to the actions hook.
+
+        If nothing has changed since the last build plan has been computed for this preset and context, and that plan
+        had nothing to load or update, the scene is reported as up to date straight away without running any hook:
+        the missing files have already been passed to the actions hook when that plan was computed.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together. A
+                            published file matched by several presets is only loaded once, using the loader action
+                            of the first preset matching it.
+        :param context:     The context used to resolve the preset filters. If None, the current context is used.
+        :param dry_run:     If True, only compute what would be done, without modifying the scene
+        :returns: A dictionary reporting what has been done, as returned by :meth:`execute_plan`
+        """
+
+        start_time = time.perf_counter()
+        plan, cached = self._get_plan(preset_name, context)
+
+        if cached and plan.is_empty:
+            # nothing has changed since the last time there was nothing to do
+            self._app.logger.debug(
+                "Scene Builder: the scene is up to date for %s" % plan.preset
+            )
+            report = self._create_report(plan, cached)
+        else:
+            report = self.execute_plan(plan, dry_run)
+            report["plan_cached"] = cached
+
+        report["duration"] = time.perf_counter() - start_time
+        return report
+
+    def compute_plan(self, preset_name, context=None):
+        """
+        Compute the operations needed to build the current scene according to a preset, without modifying the
+        scene. The plan can be exported as JSON for review using :meth:`BuildPlan.to_json`, and executed later using
+        :meth:`execute_plan`.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together
+        :param context:     The context used to resolve the preset filters. If None, the current context is used.
+        :returns: A :class:`BuildPlan`
+        """
+        return self._get_plan(preset_name, context)[0]
+
+    def execute_plan(self, plan, dry_run=False):
+        """
+        Build the current scene according to a build plan, for example a plan computed by :meth:`compute_plan` or
+        replayed from its JSON export.
+
+        :param plan:    The :class:`BuildPlan` to execute
+        :param dry_run: If True, only report what would be done, without modifying the scene
+        :returns: A dictionary reporting what has been done, with the following keys: *context*, *preset*,
+            *loaded*, *updated* and *failed* (lists of published files), *missing* (list of published files loaded
+            in the scene but not part of the preset anymore), *up_to_date* (number of files already up to date),
+            *scene_up_to_date* (True if there was nothing to load or update), *plan_cached* (True if the plan has been reused
+            without running the preset queries) and *duration* (in seconds)
+        """
+
+        start_time = time.perf_counter()
+        report = self._create_report(plan)
+
+        if dry_run:
+            report["loaded"] = [sg_data for sg_data, _ in plan.to_load]
+            report["updated"] = [sg_data for _, sg_data in plan.to_update]
+            report["duration"] = time.perf_counter() - start_time
+            return report
+
+        # the scene objects of a replayed plan are only known by their PTR data
+        if any(isinstance(obj, LoadedPublish) for obj, _ in plan.to_update):
+            plan.resolve_scene_objects(SceneIndex(self._breakdown_manager.scan_scene()))
+
+        # the published files which couldn't be fetched with the fields needed to build them, for example because
+        # they've been deleted, fail to build
+        full_publishes = fetch_publishes(
+            self._app.shotgun,
+            [sg_data for sg_data, _ in plan.to_load]
+            + [sg_data for _, sg_data in plan.to_update],
+            self._build_fields,
+        )
+        to_load = []
+        for sg_data, action_name in plan.to_load:
+            if sg_data["id"] in full_publishes:
+                to_load.append((full_publishes[sg_data["id"]], action_name))
+            else:
+                report["failed"].append(sg_data)
+        to_update = []
+        for scene_obj, sg_data in plan.to_update:
+            if sg_data["id"] in full_publishes:
+                to_update.append((scene_obj, full_publishes[sg_data["id"]]))
+            else:
+                report["failed"].append(sg_data)
+        for sg_data in report["failed"]:
+            self._app.logger.error(
+                "Couldn't fetch the data of %s" % sg_data.get("name")
+            )
+
+        hook_data = [
+            {
+                "sg_data": sg_data,
+                "status": STATUS_NOT_LOADED,
+                "action_name": action_name,
+            }
+            for sg_data, action_name in to_load
+        ] + [
+            {"sg_data": sg_data, "status": STATUS_OUTDATED, "action_name": None}
+            for _, sg_data in to_update
+        ]
+        self._app.execute_hook_method(
+            "actions_hook", "pre_build_action", items=hook_data
+        )
+
+        succeeded_ids = set()
+        for sg_data, action_name in to_load:
+            try:
+                action = resolve_loader_action(
+                    self._loader_manager,
+                    sg_data,
+                    action_name,
+                    self._action_cache,
+                    self._app.context,
+                )
+                self._loader_manager.execute_multiple_actions([action])
+            except Exception:
+                self._app.logger.exception("Couldn't load %s" % sg_data.get("name"))
+                report["failed"].append(sg_data)
+            else:
+                report["loaded"].append(sg_data)
+                succeeded_ids.add(sg_data["id"])
+
+        for scene_obj, sg_data in to_update:
+            try:
+                if isinstance(scene_obj, LoadedPublish):
+                    raise sgtk.TankError(
+                        "%s isn't loaded in the scene anymore"
+                        % scene_obj.sg_data.get("name")
+                    )
+                update_to_latest_versions(
+                    self._breakdown_manager, [(scene_obj, sg_data)]
+                )
+            except Exception:
+                self._app.logger.exception("Couldn't update %s" % sg_data.get("name"))
+                report["failed"].append(sg_data)
+            else:
+                report["updated"].append(sg_data)
+                succeeded_ids.add(sg_data["id"])
+
+        self._app.execute_hook_method(
+            "actions_hook",
+            "process_missing_files",
+            items=[{"sg_data": sg_data} for sg_data in report["missing"]],
+        )
+        self._app.execute_hook_method(
+            "actions_hook",
+            "post_build_action",
+            items=[d for d in hook_data if d["sg_data"]["id"] in succeeded_ids],
+        )
+
+        report["duration"] = time.perf_counter() - start_time
+        return report
+
+    def build_contexts(self, preset_name, contexts, dry_run=False, callback=None):
+        """
+        Build a scene for each of the given contexts, one after the other.
+
+        :param preset_name: Name of the preset to use, or list of the names of several presets to build together
+        :param contexts:    List of contexts to build
+        :param dry_run:     If True, only compute what would be done, without modifying the scenes
+        :param callback:    Optional callable run after each build with the context and the build report, for example
+                            to save the scene and reset it before building the next context
+        :returns: The list of build reports, one per context
+        """
+
+        reports = []
+        for context in contexts:
+            report = self.build_from_preset(preset_name, context, dry_run)
+            if callback:
+                callback(context, report)
+            reports.append(report)
+        return reports
+
+    def _get_plan(self, preset_name, context):
+        """
+        Get the build plan of a preset, reusing the last plan computed for this preset and context if its inputs
+        haven't changed.
+
+        :returns: A (:class:`BuildPlan`, cached) tuple, where cached is True if the plan has been reused
+        """
+
+        context = context or self._app.context
+        preset = combine_presets(self._app.get_setting("presets"), preset_name)
+        if not preset:
+            raise sgtk.TankError(
+                "Unknown Scene Builder preset %s" % get_preset_name(preset_name)
+            )
+
+        sg = self._app.shotgun
+        latest_versions_only = self._app.get_setting("latest_versions_only")
+        queries = self._compiler.compile(sg, preset, context)
+        scene_index = SceneIndex(self._breakdown_manager.scan_scene())
+
+        # summarizing the query results is much cheaper than running the queries, and is enough to know whether
+        # the published files have changed since the plan has been computed
+        signature = compute_plan_signature(
+            preset,
+            scene_index,
+            queries,
+            [summarize_query(sg, query) for query in queries],
+            latest_versions_only=latest_versions_only,
+        )
+        plan_key = get_cache_key("build_plan", preset["name"], str(context))
+
+        plan_data = self._plans.get(plan_key)
+        if plan_data is None and self._plan_cache:
+            try:
+                plan_data = self._plan_cache.get(plan_key)
+            except sqlite3.Error as e:
+                self._disable_plan_cache(e)
+        if plan_data and plan_data.get("signature") == signature:
+            try:
+                plan = BuildPlan.from_dict(plan_data)
+            except sgtk.TankError:
+                pass
+            else:
+                if not plan.resolve_scene_objects(scene_index):
+                    return plan, True
+
+        plan = compute_build_plan(self._run_queries(queries, scene_index), scene_index)
+        plan.preset = preset["name"]
+        plan.context = str(context)
+        plan.signature = signature
+
+        plan_data = plan.to_dict()
+        self._plans[plan_key] = plan_data
+        if self._plan_cache:
+            try:
+                self._plan_cache.set(plan_key, preset["name"], plan_data)
+            except sqlite3.Error as e:
+                self._disable_plan_cache(e)
+        return plan, False
+
+    def _disable_plan_cache(self, error):
+        """Stop using the build plan cache after a database error, for example if it's locked or corrupted"""
+        self._app.logger.warning(
+            "Scene Builder: Disabling build plan cache %s: %s"
+            % (self._plan_cache.path, error)
+        )
+        self._plan_cache.close()
+        self._plan_cache = None
+
+    def _create_report(self, plan, plan_cached=False):
+        """Create the report of a build, before anything has been built"""
+        return {
+            "context": plan.context,
+            "preset": plan.preset,
+            "loaded": [],
+            "updated": [],
+            "failed": [],
+            "missing": [obj.sg_data for obj in plan.missing],
+            "up_to_date": len(plan.up_to_date),
+            "scene_up_to_date": plan.is_empty,
+            "plan_cached": plan_cached,
+            "duration": 0.0,
+        }
+
+    def _run_queries(self, queries, scene_index):
+        """Run the preset queries and return the list of (query, published files) tuples"""
+
+        sg = self._app.shotgun
+        latest_versions_only = self._app.get_setting("latest_versions_only")
+
+        query_results = []
+        for query in queries:
+            if latest_versions_only:
+                publishes = find_latest_publishes(sg, query, scene_index.publish_ids)
+            else:
+                publishes = sg.find(
+                    "PublishedFile", query.filters, query.fields, query.order
+                )
+            query_results.append((query, publishes))
+        return query_results
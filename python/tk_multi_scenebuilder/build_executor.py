@@ -0,0 +1,211 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import time
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+
+class BuildStep(object):
+    """A single unit of work of the build process"""
+
+    __slots__ = (
+        "description",
+        "callback",
+        "items",
+        "always_run",
+        "abort_on_failure",
+        "metric",
+    )
+
+    def __init__(
+        self,
+        description,
+        callback,
+        items=None,
+        always_run=False,
+        abort_on_failure=False,
+        metric="build_step",
+    ):
+        """
+        Class constructor.
+
+        :param description: Description of the step, displayed while the step is running
+        :param callback:    Callable executing the step. The step is considered as failed if it raises an exception.
+        :param items:       List of the items processed by the step, used to keep track of the ones which have been
+                            successfully built
+        :param always_run:  If True, the step is executed even if the build has been cancelled or aborted
+        :param abort_on_failure: If True, the build is aborted if the step fails, as the following steps depend on
+                            it. Only the remaining steps flagged to always run are then executed.
+        :param metric:      Name under which the duration of the step is recorded. The durations of the steps sharing
+                            the same name are added up.
+        """
+        self.description = description
+        self.callback = callback
+        self.items = items or []
+        self.always_run = always_run
+        self.abort_on_failure = abort_on_failure
+        self.metric = metric
+
+
+class BuildExecutor(QtCore.QObject):
+    """
+    Execute the steps of a build one by one, giving the control back to the event loop in between the steps so the
+    UI stays responsive and the build can be cancelled.
+    """
+
+    # Signal emitted before a step is executed, with the step index, the number of steps and the step description
+    step_started = QtCore.Signal(int, int, str)
+
+    # Signal emitted once the build is over, with a flag telling if it has been cancelled. A build aborted after a
+    # step failure isn't considered as cancelled, see :attr:`aborted`.
+    finished = QtCore.Signal(bool)
+
+    def __init__(self, parent=None, metrics=None):
+        """
+        Class constructor.
+
+        :param parent:  The parent QObject for this instance
+        :param metrics: Optional :class:`Metrics` instance used to record the duration of the steps
+        """
+
+        QtCore.QObject.__init__(self, parent)
+
+        self._bundle = sgtk.platform.current_bundle()
+        self._steps = []
+        self._current_step = 0
+        self._cancelled = False
+        self._aborted = False
+        self._running = False
+        self._start_time = None
+        self._item_count = 0
+        self._metrics = metrics
+        self._step_timings = {}
+        self.succeeded_items = []
+        self.failed_items = []
+
+    @property
+    def is_running(self):
+        """True if a build is in progress."""
+        return self._running
+
+    @property
+    def aborted(self):
+        """True if the last build has been aborted because a step flagged to abort on failure has failed."""
+        return self._aborted
+
+    @property
+    def throughput(self):
+        """Number of items built per second since the beginning of the build."""
+        if not self._start_time:
+            return 0.0
+        elapsed = time.perf_counter() - self._start_time
+        return self._item_count / elapsed if elapsed > 0 else 0.0
+
+    def run(self, steps):
+        """
+        Start executing the given steps. This method returns straight away, the steps are executed as the events are
+        processed.
+
+        :param steps: List of :class:`BuildStep` to execute
+        """
+
+        self._steps = steps
+        self._current_step = 0
+        self._cancelled = False
+        self._aborted = False
+        self._running = True
+        self._start_time = time.perf_counter()
+        self._item_count = 0
+        self._step_timings = {}
+        self.succeeded_items = []
+        self.failed_items = []
+
+        QtCore.QTimer.singleShot(0, self._run_next_step)
+
+    def cancel(self):
+        """
+        Cancel the build. The step in progress is completed, and only the remaining steps flagged to always run will be
+        executed.
+        """
+        self._cancelled = True
+
+    def _run_next_step(self):
+        """Execute the next step of the build and schedule the following one"""
+
+        while self._current_step < len(self._steps):
+            step = self._steps[self._current_step]
+            self._current_step += 1
+            if (self._cancelled or self._aborted) and not step.always_run:
+                if self._aborted:
+                    # the items of the steps skipped because of a failure couldn't be built
+                    self.failed_items.extend(step.items)
+                continue
+
+            self.step_started.emit(
+                self._current_step, len(self._steps), step.description
+            )
+
+            timed = self._metrics is not None and self._metrics.enabled
+            if timed:
+                start_time = time.perf_counter()
+
+            failed = False
+            try:
+                step.callback()
+            except Exception:
+                self._bundle.logger.exception(
+                    "Build step failed: %s" % step.description
+                )
+                self.failed_items.extend(step.items)
+                failed = True
+                if step.abort_on_failure:
+                    self._aborted = True
+            else:
+                self.succeeded_items.extend(step.items)
+            self._item_count += len(step.items)
+
+            if timed:
+                duration, executed, failures = self._step_timings.get(
+                    step.metric, (0.0, 0, 0)
+                )
+                self._step_timings[step.metric] = (
+                    duration + time.perf_counter() - start_time,
+                    executed + 1,
+                    failures + int(failed),
+                )
+
+            # give the control back to the event loop before running the next step
+            QtCore.QTimer.singleShot(0, self._run_next_step)
+            return
+
+        self._running = False
+        self._record_timings()
+        self.finished.emit(self._cancelled)
+
+    def _record_timings(self):
+        """Record the time spent in each kind of step, as well as the total duration of the build"""
+
+        if self._metrics is None or not self._metrics.enabled:
+            return
+
+        for metric, (duration, executed, failures) in sorted(
+            self._step_timings.items()
+        ):
+            self._metrics.record(metric, duration, executed=executed, failed=failures)
+        self._metrics.record(
+            "build",
+            time.perf_counter() - self._start_time,
+            items_built=len(self.succeeded_items),
+            items_failed=len(self.failed_items),
+            cancelled=self._cancelled,
+            aborted=self._aborted,
+        )
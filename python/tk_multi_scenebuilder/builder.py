@@ -0,0 +1,382 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+
+import sgtk
+
+from .cache import get_cache_key
+from .scene_index import LoadedPublish, get_publish_key
+
+# status of a published file regarding the current scene
+STATUS_UP_TO_DATE, STATUS_OUTDATED, STATUS_NOT_LOADED, STATUS_INVALID = range(4)
+
+# maximum number of published files to fetch in a single query when retrieving their full set of fields
+FETCH_BATCH_SIZE = 500
+
+# version of the serialized build plans, to be increased when their format changes
+BUILD_PLAN_VERSION = 1
+
+
+class BuildPlan(object):
+    """
+    The operations needed to build a scene according to the results of the preset queries, computed without any
+    Qt dependency so it can be used in batch mode.
+
+    A plan can be serialized, to be stored along with the signature of the inputs it has been computed from, or
+    exported as JSON to be reviewed and replayed later.
+    """
+
+    def __init__(self):
+        """Class constructor"""
+
+        # list of (published file, action name) tuples for the files to load
+        self.to_load = []
+        # list of (scene object, latest published file) tuples for the files to update
+        self.to_update = []
+        # list of the published files already loaded in their latest version
+        self.up_to_date = []
+        # list of the scene objects which aren't part of the preset anymore
+        self.missing = []
+
+        # name of the preset and context the plan has been computed for, and signature of its inputs, as returned by
+        # :func:`compute_plan_signature`
+        self.preset = None
+        self.context = None
+        self.signature = None
+
+    @property
+    def is_empty(self):
+        """
+        True if there is nothing to load or update to build the scene. The missing scene objects aren't taken into
+        account: they're reported to the actions hook but the builder never removes them, so they would keep the
+        plan from ever being empty.
+        """
+        return not (self.to_load or self.to_update)
+
+    def to_dict(self):
+        """
+        Serialize the plan. The scene objects are stored as the PTR data of the published files they have loaded.
+
+        :returns: A dictionary
+        """
+        return {
+            "version": BUILD_PLAN_VERSION,
+            "preset": self.preset,
+            "context": self.context,
+            "signature": self.signature,
+            "to_load": [
+                {"sg_data": sg_data, "action_name": action_name}
+                for sg_data, action_name in self.to_load
+            ],
+            "to_update": [
+                {"loaded": obj.sg_data, "sg_data": sg_data}
+                for obj, sg_data in self.to_update
+            ],
+            "up_to_date": list(self.up_to_date),
+            "missing": [obj.sg_data for obj in self.missing],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a plan from its serialized data. The scene objects are represented by :class:`LoadedPublish` instances
+        until they are resolved using :meth:`resolve_scene_objects`.
+
+        :param data: Dictionary, as returned by :meth:`to_dict`
+        :returns: A :class:`BuildPlan`
+        :raises: :class:`sgtk.TankError` if the data has been serialized using an unsupported format
+        """
+
+        if data.get("version") != BUILD_PLAN_VERSION:
+            raise sgtk.TankError(
+                "Unsupported build plan version %s" % data.get("version")
+            )
+
+        plan = cls()
+        plan.preset = data["preset"]
+        plan.context = data["context"]
+        plan.signature = data["signature"]
+        plan.to_load = [(d["sg_data"], d["action_name"]) for d in data["to_load"]]
+        plan.to_update = [
+            (LoadedPublish(d["loaded"]), d["sg_data"]) for d in data["to_update"]
+        ]
+        plan.up_to_date = list(data["up_to_date"])
+        plan.missing = [LoadedPublish(sg_data) for sg_data in data["missing"]]
+        return plan
+
+    def to_json(self, indent=2):
+        """
+        Export the plan as JSON, for example to review it before building the scene.
+
+        :param indent: Indentation used to format the JSON document
+        :returns: The JSON document as a string
+        """
+        return json.dumps(self.to_dict(), indent=indent, sort_keys=True, default=str)
+
+    @classmethod
+    def from_json(cls, document):
+        """
+        Load a plan exported as JSON.
+
+        :param document: The JSON document, as returned by :meth:`to_json`
+        :returns: A :class:`BuildPlan`
+        """
+        return cls.from_dict(json.loads(document))
+
+    def resolve_scene_objects(self, scene_index):
+        """
+        Replace the :class:`LoadedPublish` stand-ins of a deserialized plan by the objects loaded in the scene.
+
+        :param scene_index: The :class:`SceneIndex` of the objects loaded in the scene
+        :returns: The list of the stand-ins which couldn't be found in the scene
+        """
+
+        unresolved = []
+        to_update = []
+        for obj, sg_data in self.to_update:
+            if isinstance(obj, LoadedPublish):
+                obj = scene_index.get(obj.sg_data["id"]) or obj
+                if isinstance(obj, LoadedPublish):
+                    unresolved.append(obj)
+            to_update.append((obj, sg_data))
+        self.to_update = to_update
+        self.missing = [
+            (
+                scene_index.get(obj.sg_data["id"]) or obj
+                if isinstance(obj, LoadedPublish)
+                else obj
+            )
+            for obj in self.missing
+        ]
+        return unresolved
+
+
+def compute_plan_signature(preset, scene_index, queries, query_summaries, **settings):
+    """
+    Compute the signature of the inputs of a build plan. As long as the signature doesn't change, the plan computed
+    from these inputs is still valid and the preset queries don't need to be run again.
+
+    :param preset:          The preset, as defined in the app settings. The queries don't depend on the loader
+                            actions of the preset, which decide how the files are loaded.
+    :param scene_index:     The :class:`SceneIndex` of the objects loaded in the scene
+    :param queries:         List of the :class:`PresetQuery` of the preset, which depend on the preset definition
+                            and on the context
+    :param query_summaries: List of the summaries of the query results, one per query, as returned by
+                            :func:`query.summarize_query`
+    :param settings:        Any other setting affecting the plan, like the latest versions only mode
+    :returns: The signature, as a string
+    """
+    return get_cache_key(
+        preset,
+        sorted(scene_index.publish_ids),
+        [query.key for query in queries],
+        query_summaries,
+        settings,
+    )
+
+
+def compute_build_plan(query_results, scene_index):
+    """
+    Compute the status of the published files returned by the preset queries, the same way the
+    :class:`FileModel` does, and gather the operations needed to build the scene.
+
+    A published file matched by several actions of the preset is only loaded once, using the loader action of the
+    first of these actions.
+
+    :param query_results: List of (:class:`PresetQuery`, published files) tuples. The published files must be
+                          sorted in descending order of version number.
+    :param scene_index:   The :class:`SceneIndex` of the objects loaded in the scene
+    :returns: A :class:`BuildPlan`
+    """
+
+    plan = BuildPlan()
+
+    # latest version of each published file, along with the position and the loader action of the first preset
+    # action matching it
+    latest_publishes = {}
+    outdated_objs = {}
+
+    for query, sg_publishes in query_results:
+        for action_index, (action_mappings, publishes) in zip(
+            query.action_indexes, query.demultiplex(sg_publishes)
+        ):
+
+            action_keys = set()
+            for publish in publishes:
+                key = get_publish_key(publish)
+                # the first published file we find is the latest version, the older versions are only used to
+                # check whether the file is out of date
+                if key not in action_keys:
+                    action_keys.add(key)
+                    if (
+                        key not in latest_publishes
+                        or action_index < latest_publishes[key][0]
+                    ):
+                        latest_publishes[key] = (
+                            action_index,
+                            publish,
+                            action_mappings.get(publish["published_file_type"]["name"]),
+                        )
+                    continue
+                scene_obj = scene_index.get(publish["id"])
+                if scene_obj and key not in outdated_objs:
+                    outdated_objs[key] = scene_obj
+
+    # the operations are sorted by preset action, so the build order doesn't depend on the order of the queries
+    for key, (_, publish, action_name) in sorted(
+        latest_publishes.items(), key=lambda e: e[1][0]
+    ):
+        if key in outdated_objs:
+            plan.to_update.append((outdated_objs[key], publish))
+        elif scene_index.get(publish["id"]):
+            plan.up_to_date.append(publish)
+        else:
+            plan.to_load.append((publish, action_name))
+
+    plan.missing = scene_index.get_orphans(set(latest_publishes))
+    return plan
+
+
+def resolve_loader_action(loader_manager, sg_data, action_name, action_cache, context):
+    """
+    Get the loader action to use to load a published file.
+
+    The loader actions available for a file only depend on its type, so the actions are only resolved once per
+    published file type and action name, and then reused for all the files of the same type.
+
+    :param loader_manager: The loader manager used to get the actions
+    :param sg_data:        Dictionary of PTR data representing the published file to load
+    :param action_name:    Name of the loader action to use
+    :param action_cache:   Dictionary used to store the resolved actions, shared between the calls
+    :param context:        The context the loader actions are executed in
+    :returns: The loader action, ready to be passed to the loader manager
+    :raises: :class:`sgtk.TankError` if the action isn't available for this published file
+    """
+
+    publish_type = sg_data.get("published_file_type") or {}
+    cache_key = (publish_type.get("id"), action_name, str(context))
+    if cache_key not in action_cache:
+        action_cache[cache_key] = None
+        loader_actions = loader_manager.get_actions_for_publish(
+            sg_data, loader_manager.UI_AREA_MAIN
+        )
+        for action in loader_actions:
+            if action["name"] == action_name:
+                action_cache[cache_key] = action
+                break
+
+    if not action_cache[cache_key]:
+        raise sgtk.TankError(
+            "Couldn't find loader action %s for %s" % (action_name, sg_data["name"])
+        )
+
+    return dict(action_cache[cache_key], sg_publish_data=sg_data)
+
+
+def resolve_latest_publishes(sg, scene_objs, fields):
+    """
+    Get the latest version of the published files loaded for the given scene objects, using a single PTR query.
+
+    :param sg:         Shotgun API handle
+    :param scene_objs: List of scene objects, as returned by the breakdown manager
+    :param fields:     List of PTR fields to query
+    :returns: A dictionary where the key is the published file key, as returned by
+        :func:`scene_index.get_publish_key`, and the value the latest version of the published file
+    """
+
+    if not scene_objs:
+        return {}
+
+    key_filters = []
+    for obj in scene_objs:
+        key_filters.append(
+            {
+                "filter_operator": "all",
+                "filters": [
+                    ["task", "is", obj.sg_data.get("task")],
+                    [
+                        "published_file_type",
+                        "is",
+                        obj.sg_data.get("published_file_type"),
+                    ],
+                    ["name", "is", obj.sg_data.get("name")],
+                ],
+            }
+        )
+
+    publishes = sg.find(
+        "PublishedFile",
+        [{"filter_operator": "any", "filters": key_filters}],
+        fields,
+        order=[{"field_name": "version_number", "direction": "desc"}],
+    )
+
+    # the published files are sorted by descending version number, the first one we find is the latest
+    latest_publishes = {}
+    for publish in publishes:
+        latest_publishes.setdefault(get_publish_key(publish), publish)
+    return latest_publishes
+
+
+def fetch_publishes(sg, publishes, fields):
+    """
+    Fetch the given published files again with more fields, for example the ones needed by the loader actions when
+    the files have been queried with a slim projection.
+
+    :param sg:         Shotgun API handle
+    :param publishes:  List of dictionaries of PTR data representing the published files to fetch
+    :param fields:     List of PTR fields to query
+    :returns: A dictionary where the key is the published file id and the value the published file with all the
+        requested fields
+    """
+
+    ids = sorted(set(p["id"] for p in publishes))
+    full_publishes = {}
+    for i in range(0, len(ids), FETCH_BATCH_SIZE):
+        for publish in sg.find(
+            "PublishedFile", [["id", "in", ids[i : i + FETCH_BATCH_SIZE]]], fields
+        ):
+            full_publishes[publish["id"]] = publish
+    return full_publishes
+
+
+def update_to_latest_versions(breakdown_manager, updates, sg=None, fields=None):
+    """
+    Update some scene objects to the latest version of their published file.
+
+    The latest versions already known by the caller are used as is, the missing ones are resolved using a single
+    PTR query rather than one query per scene object. Only the PTR queries are batched: the breakdown manager
+    doesn't provide any API to update several objects at once, so it's still called once per scene object.
+
+    :param breakdown_manager: The breakdown manager used to update the scene objects
+    :param updates:           List of (scene object, latest published file) tuples. The latest published file can be
+                              None if it isn't known yet, in which case it will be queried.
+    :param sg:                Shotgun API handle, only needed if some latest published files are unknown
+    :param fields:            List of PTR fields to query for the unknown latest published files
+    :returns: The list of scene objects which have been updated
+    """
+
+    missing_objs = [obj for obj, sg_data in updates if not sg_data]
+    latest_publishes = {}
+    if missing_objs:
+        latest_publishes = resolve_latest_publishes(sg, missing_objs, fields)
+
+    updated_objs = []
+    for obj, sg_data in updates:
+        sg_data = sg_data or latest_publishes.get(get_publish_key(obj.sg_data))
+        if not sg_data or sg_data["id"] == obj.sg_data["id"]:
+            continue
+        # this is what the breakdown manager would compute when querying the latest published file of the object
+        obj.latest_published_file = sg_data
+        breakdown_manager.update_to_latest_version(obj)
+        updated_objs.append(obj)
+
+    return updated_objs
@@ -0,0 +1,185 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+# PTR fields whose value changes every time they're queried, like the signed URLs of the thumbnails. They're ignored
+# when checking if some query results have changed.
+VOLATILE_FIELDS = ["image"]
+
+
+def get_cache_key(*args):
+    """
+    Compute a cache key from a set of JSON serializable values, like a preset name, resolved filters or a list of
+    fields.
+
+    :returns: The key as a string
+    """
+    data = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def get_stable_data(sg_data):
+    """
+    Get the PTR data of an entity without its volatile fields, to check if it has changed.
+
+    :param sg_data: Dictionary of PTR data
+    :returns: A new dictionary, without the fields listed in :data:`VOLATILE_FIELDS`
+    """
+    return dict((k, v) for k, v in sg_data.items() if k not in VOLATILE_FIELDS)
+
+
+def get_results_digest(sg_records):
+    """
+    Compute a digest of some query results, ignoring the volatile fields of the records.
+
+    :param sg_records: List of dictionaries of PTR data
+    :returns: The digest as a string
+    """
+    return get_cache_key([get_stable_data(r) for r in sg_records])
+
+
+class QueryCache(object):
+    """
+    SQLite-backed cache used to store the results of the PTR queries run to load a preset, so the model can be
+    populated instantly when reopening the app and be revalidated in the background.
+
+    The cache is size-bounded: the least recently used entries are evicted once the maximum size is reached.
+    """
+
+    def __init__(self, path, max_size):
+        """
+        Class constructor.
+
+        :param path:     Path to the SQLite database file
+        :param max_size: Maximum size of the cached data, in bytes
+        """
+        self._path = path
+        self._max_size = max_size
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS query_cache (
+                key TEXT PRIMARY KEY,
+                preset_name TEXT,
+                digest TEXT,
+                data BLOB,
+                size INTEGER,
+                last_access REAL
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS preset_name_idx ON query_cache (preset_name)"
+        )
+        self._connection.commit()
+
+    @property
+    def path(self):
+        """Path to the SQLite database file."""
+        return self._path
+
+    def close(self):
+        """Close the connection to the database"""
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def get(self, key):
+        """
+        Get the data stored in the cache for the given key.
+
+        :param key: Cache key, as returned by :func:`get_cache_key`
+        :returns: The cached data, None if nothing was found
+        """
+        row = self._connection.execute(
+            "SELECT data FROM query_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+
+        self._connection.execute(
+            "UPDATE query_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self._connection.commit()
+
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def set(self, key, preset_name, data, digest=None):
+        """
+        Store some data in the cache. Nothing is written if the data hasn't changed.
+
+        :param key:         Cache key, as returned by :func:`get_cache_key`
+        :param preset_name: Name of the preset the data belongs to
+        :param data:        The data to store. It must be picklable.
+        :param digest:      Digest used to check if the data has changed, for example as returned by
+                            :func:`get_results_digest`. If None, the digest of the serialized data is used.
+        :returns: True if the stored data has changed, False otherwise
+        """
+        blob = zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        if digest is None:
+            digest = hashlib.sha1(blob).hexdigest()
+
+        row = self._connection.execute(
+            "SELECT digest FROM query_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row and row[0] == digest:
+            return False
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (key, preset_name, digest, blob, len(blob), time.time()),
+        )
+        self._evict()
+        self._connection.commit()
+
+        return True
+
+    def invalidate(self, preset_name=None):
+        """
+        Remove entries from the cache.
+
+        :param preset_name: Name of the preset to remove the entries for. If None, the whole cache is cleared.
+        """
+        if preset_name is None:
+            self._connection.execute("DELETE FROM query_cache")
+        else:
+            self._connection.execute(
+                "DELETE FROM query_cache WHERE preset_name = ?", (preset_name,)
+            )
+        self._connection.commit()
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache size is below the maximum size"""
+
+        total_size = (
+            self._connection.execute("SELECT SUM(size) FROM query_cache").fetchone()[0]
+            or 0
+        )
+        if total_size <= self._max_size:
+            return
+
+        rows = self._connection.execute(
+            "SELECT key, size FROM query_cache ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total_size <= self._max_size:
+                break
+            self._connection.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+            total_size -= size
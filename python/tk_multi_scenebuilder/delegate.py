@@ -17,6 +17,12 @@ delegates = sgtk.platform.import_framework("tk-framework-qtwidgets", "delegates"
 ViewItemDelegate = delegates.ViewItemDelegate
 ViewItemAction = delegates.ViewItemAction
 
+# Action data returned to the delegate when painting the items. They only depend on the item status and check state,
+# so they're built once and shared by all the items instead of being recomputed on each paint event.
+_HIDDEN_ACTION_DATA = {"visible": False}
+_CHECK_BOX_ACTION_DATA = {}
+_STATUS_ICON_ACTION_DATA = {}
+
 
 def create_file_delegate(view):
     """
@@ -26,6 +32,8 @@ def create_file_delegate(view):
     :return: The delegate for the view
     """
 
+    _build_action_data()
+
     # create the delegate
     delegate = ViewItemDelegate(view)
 
@@ -60,6 +68,34 @@ def create_file_delegate(view):
     return delegate
 
 
+def _build_action_data():
+    """
+    Build the action data used for each item status and check state. This can't be done at import time as the
+    icons require an application to be running.
+    """
+
+    if _STATUS_ICON_ACTION_DATA:
+        return
+
+    for status, icon_path in FileModel.STATUS_ICON_PATHS.items():
+        _STATUS_ICON_ACTION_DATA[status] = {
+            "visible": True,
+            "icon": QtGui.QIcon(icon_path),
+        }
+
+    for checkbox_state, state_flag in [
+        (QtCore.Qt.Checked, QtGui.QStyle.State_On),
+        (QtCore.Qt.PartiallyChecked, QtGui.QStyle.State_NoChange),
+        (QtCore.Qt.Unchecked, QtGui.QStyle.State_Off),
+    ]:
+        _CHECK_BOX_ACTION_DATA[checkbox_state] = {
+            "visible": True,
+            "state": QtGui.QStyle.State_Active
+            | QtGui.QStyle.State_Enabled
+            | state_flag,
+        }
+
+
 def get_file_item_state(parent, index):
     """
     Callback function triggered by the ViewItemDelegate.
@@ -75,28 +111,18 @@ def get_file_item_state(parent, index):
     """
 
     if index.data(FileModel.TYPE_ROLE) == FileModel.GROUP_TYPE:
-        return {"visible": False}
+        return _HIDDEN_ACTION_DATA
 
     if index.data(FileModel.STATUS_ROLE) in [
         FileModel.STATUS_INVALID,
         FileModel.STATUS_UP_TO_DATE,
     ]:
-        return {"visible": False}
+        return _HIDDEN_ACTION_DATA
 
     checkbox_state = index.data(QtCore.Qt.CheckStateRole)
-
-    state = QtGui.QStyle.State_Active | QtGui.QStyle.State_Enabled
-    if checkbox_state == QtCore.Qt.Checked:
-        state |= QtGui.QStyle.State_On
-    elif checkbox_state == QtCore.Qt.PartiallyChecked:
-        state |= QtGui.QStyle.State_NoChange
-    else:
-        state |= QtGui.QStyle.State_Off
-
-    return {
-        "visible": True,
-        "state": state,
-    }
+    return _CHECK_BOX_ACTION_DATA.get(
+        checkbox_state, _CHECK_BOX_ACTION_DATA[QtCore.Qt.Unchecked]
+    )
 
 
 def get_status_icon(parent, index):
@@ -113,11 +139,8 @@ def get_status_icon(parent, index):
     """
 
     if index.data(FileModel.TYPE_ROLE) == FileModel.GROUP_TYPE:
-        return {"visible": False}
-
-    # get the path to the icon
-    status = index.data(FileModel.STATUS_ROLE)
-    icon_path = FileModel.STATUS_ICON_PATHS.get(status)
-    icon = QtGui.QIcon(icon_path)
+        return _HIDDEN_ACTION_DATA
 
-    return {"visible": True, "icon": icon}
+    return _STATUS_ICON_ACTION_DATA.get(
+        index.data(FileModel.STATUS_ROLE), _HIDDEN_ACTION_DATA
+    )
@@ -8,12 +8,24 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import functools
+
 import sgtk
 from sgtk.platform.qt import QtGui, QtCore
 
 from .ui.dialog import Ui_Dialog
+from .builder import (
+    fetch_publishes,
+    resolve_loader_action,
+    update_to_latest_versions,
+)
+from .build_executor import BuildExecutor, BuildStep
+from .scene_index import get_publish_key
+from .metrics import Metrics
 from .model import FileModel
+from .filter_model import FileFilterProxyModel
 from .delegate import create_file_delegate
+from .thumbnail_loader import ThumbnailLoader
 
 task_manager = sgtk.platform.import_framework(
     "tk-framework-shotgunutils", "task_manager"
@@ -26,6 +38,10 @@ shotgun_globals = sgtk.platform.import_framework(
 
 
 class AppDialog(QtGui.QWidget):
+
+    # delay, in milliseconds, before loading a preset once it has been selected
+    PRESET_CHANGE_DELAY = 300
+
     def __init__(self, parent=None):
         """
         Class constructor.
@@ -75,6 +91,15 @@ class AppDialog(QtGui.QWidget):
         preset_names = [p["name"] for p in presets]
         self._ui.presets.addItems(preset_names)
 
+        # other presets can be loaded and built along with the selected one
+        self._extra_presets_menu = QtGui.QMenu(self)
+        for preset_name in preset_names:
+            action = self._extra_presets_menu.addAction(preset_name)
+            action.setData(preset_name)
+            action.setCheckable(True)
+            action.toggled.connect(self._on_preset_changed)
+        self._ui.extra_presets_button.setMenu(self._extra_presets_menu)
+
         # finally, create the model used to retrieve the files, and connect it to the view using a custom delegate
         self._model = FileModel(
             self,
@@ -82,20 +107,78 @@ class AppDialog(QtGui.QWidget):
             loader_app=loader_app,
             breakdown_manager=self._breakdown_manager,
         )
-        self._ui.view.setModel(self._model)
         self._model.data_loaded.connect(lambda v=self._ui.view: v.expandAll())
+        self._model.data_loaded.connect(self._update_type_filter)
+
+        # the view displays the files through a proxy model, so they can be filtered
+        self._proxy_model = FileFilterProxyModel(self)
+        self._proxy_model.setSourceModel(self._model)
+        self._proxy_model.rowsInserted.connect(self._on_model_rows_inserted)
+        self._ui.view.setModel(self._proxy_model)
+
+        self._ui.status_filter.addItem("All Statuses")
+        for status, name in sorted(FileModel.GROUP_NAMES.items()):
+            self._ui.status_filter.addItem(name, status)
+        self._ui.type_filter.addItem("All Types")
 
         self._delegate = create_file_delegate(self._ui.view)
         self._ui.view.setItemDelegate(self._delegate)
 
+        # only load the thumbnails of the files visible in the view
+        self._thumbnail_loader = ThumbnailLoader(
+            self._ui.view,
+            self._model,
+            prefetch_margin=self._bundle.get_setting("thumbnail_prefetch_rows"),
+        )
+
+        # the build executor runs the build step by step, reporting its progress
+        self._build_executor = BuildExecutor(self, metrics=Metrics(self._bundle))
+        self._build_executor.step_started.connect(self._on_build_step_started)
+        self._build_executor.finished.connect(self._on_build_finished)
+        self._set_building(False)
+
         # # widget connections
+        self._ui.cancel_button.clicked.connect(self._on_cancel_build)
         self._ui.build_button.clicked.connect(self.build_scene)
-        self._ui.presets.currentIndexChanged.connect(
-            lambda idx: self._model.load_data(self._ui.presets.itemText(idx))
+        self._ui.refresh_button.clicked.connect(self._model.refresh)
+        self._ui.presets.currentIndexChanged.connect(self._on_preset_changed)
+        self._ui.filter_text.textChanged.connect(self._apply_filter)
+        self._ui.status_filter.currentIndexChanged.connect(self._apply_filter)
+        self._ui.type_filter.currentIndexChanged.connect(self._apply_filter)
+        self._ui.check_button.clicked.connect(
+            lambda: self._model.set_check_states(
+                self._proxy_model.filtered_items(), QtCore.Qt.Checked
+            )
+        )
+        self._ui.uncheck_button.clicked.connect(
+            lambda: self._model.set_check_states(
+                self._proxy_model.filtered_items(), QtCore.Qt.Unchecked
+            )
+        )
+
+        # when quickly switching between presets, only load the last one selected
+        self._preset_timer = QtCore.QTimer(self)
+        self._preset_timer.setSingleShot(True)
+        self._preset_timer.setInterval(self.PRESET_CHANGE_DELAY)
+        self._preset_timer.timeout.connect(
+            lambda: self._model.load_data(self._get_selected_presets())
         )
 
         # finally load the model data
-        self._model.load_data(self._ui.presets.currentText())
+        self._model.load_data(self._get_selected_presets())
+
+    def showEvent(self, event):
+        """
+        Overriden method triggered when the widget is shown. The scene may have changed while the dialog was hidden,
+        so it will be scanned again on the next load or refresh. The changes made by the builds don't need a new
+        scan, the files they load or update are registered in the scene index as they go.
+
+        :param event: Show event
+        """
+        # the spontaneous events are sent by the window system, for example when restoring the minimized dialog
+        if not event.spontaneous():
+            self._model.invalidate_scene_scan()
+        return QtGui.QWidget.showEvent(self, event)
 
     def closeEvent(self, event):
         """
@@ -105,6 +188,12 @@ class AppDialog(QtGui.QWidget):
         :param event: Close event
         """
 
+        # stop the build in progress, only the steps flagged to always run will still be executed. The UI and the model
+        # aren't updated once it's over as they're being destroyed.
+        if self._build_executor.is_running:
+            self._build_executor.cancel()
+            self._build_executor.finished.disconnect(self._on_build_finished)
+
         # clear up the data model
         if self._model:
             self._model.destroy()
@@ -117,8 +206,99 @@ class AppDialog(QtGui.QWidget):
 
         return QtGui.QWidget.closeEvent(self, event)
 
+    def _on_cancel_build(self):
+        """Slot triggered when the user cancels the build, which stops once the current step is completed"""
+        self._build_executor.cancel()
+        self._ui.cancel_button.setEnabled(False)
+
+    def _on_preset_changed(self, index):
+        """
+        Slot triggered when the user selects another preset, or selects other presets to load along with it. The work
+        in progress for the previous selection is cancelled straight away but the new presets are only loaded once
+        the selection has settled, unless their data is already in memory.
+
+        :param index: Index of the selected preset
+        """
+        self._model.clear()
+        if self._model.is_preset_loaded(self._get_selected_presets()):
+            self._preset_timer.stop()
+            self._model.load_data(self._get_selected_presets())
+        else:
+            self._preset_timer.start()
+
+    def _get_selected_presets(self):
+        """
+        Get the names of the selected presets. The preset selected in the combo box comes first, so it takes
+        precedence when several presets match the same published file.
+
+        :returns: A list of preset names
+        """
+        preset_names = [self._ui.presets.currentText()]
+        for action in self._extra_presets_menu.actions():
+            if action.isChecked() and action.data() not in preset_names:
+                preset_names.append(action.data())
+        return preset_names
+
+    def _on_model_rows_inserted(self, parent, first, last):
+        """
+        Slot triggered when some rows are inserted in the model. As the model is populated in chunks, expand the
+        new groups straight away so their content is visible before all the data is loaded.
+
+        :param parent: The parent index of the inserted rows
+        :param first:  The first inserted row
+        :param last:   The last inserted row
+        """
+        if parent.isValid():
+            return
+        for row in range(first, last + 1):
+            self._ui.view.expand(self._proxy_model.index(row, 0))
+
+    def _apply_filter(self, *args):
+        """Slot triggered when the filter is edited, to only display the files matching it"""
+
+        status = self._ui.status_filter.itemData(self._ui.status_filter.currentIndex())
+        type_name = (
+            self._ui.type_filter.currentText()
+            if self._ui.type_filter.currentIndex() > 0
+            else None
+        )
+        self._proxy_model.set_filter(
+            self._ui.filter_text.text(),
+            [status] if status is not None else None,
+            [type_name] if type_name else None,
+        )
+        self._ui.view.expandAll()
+
+    def _update_type_filter(self):
+        """Slot triggered once the model data is loaded, to list the published file types of the files"""
+
+        current_type = (
+            self._ui.type_filter.currentText()
+            if self._ui.type_filter.currentIndex() > 0
+            else None
+        )
+        type_names = self._model.search_index.type_names
+
+        self._ui.type_filter.blockSignals(True)
+        self._ui.type_filter.clear()
+        self._ui.type_filter.addItem("All Types")
+        self._ui.type_filter.addItems(type_names)
+        if current_type in type_names:
+            self._ui.type_filter.setCurrentIndex(type_names.index(current_type) + 1)
+        self._ui.type_filter.blockSignals(False)
+
+        # the files may have changed since the filter has been applied
+        if self._proxy_model.is_filtering:
+            self._apply_filter()
+
     def build_scene(self):
-        """"""
+        """
+        Build the scene: load the checked files which are not loaded yet and update the out-of-date ones. The build is
+        executed step by step, so the UI stays responsive and the build can be cancelled.
+        """
+
+        if self._build_executor.is_running:
+            return
 
         items_to_process = []
         hook_data = []
@@ -127,7 +307,8 @@ class AppDialog(QtGui.QWidget):
         # collect all the items that are going to be processed at build time
         for row in range(self._model.rowCount()):
 
-            group_item = self._model.item(row, 0)
+            group_index = self._model.index(row, 0)
+            group_item = self._model.item_from_index(group_index)
 
             # for the files already up-to-date, we don't need to do anything
             if group_item.data(FileModel.STATUS_ROLE) == FileModel.STATUS_UP_TO_DATE:
@@ -135,8 +316,8 @@ class AppDialog(QtGui.QWidget):
 
             for sub_row in range(group_item.rowCount()):
 
-                idx = self._model.index(sub_row, 0, parent=group_item.index())
-                file_item = self._model.itemFromIndex(idx)
+                idx = self._model.index(sub_row, 0, group_index)
+                file_item = self._model.item_from_index(idx)
 
                 # if we're dealing with the missing files, we just want to collect all of them to pass the list
                 # to a hook at build time
@@ -161,42 +342,237 @@ class AppDialog(QtGui.QWidget):
                         }
                     )
 
-        # now, it's time to launch the build process!
-        self._bundle.execute_hook_method(
-            "actions_hook", "pre_build_action", items=hook_data
-        )
+        # now, it's time to launch the build process! The model only holds the fields needed to display the files, so
+        # the first step fetches the full PTR data of the files to build, in a single batch
+        action_cache = {}
+        latest_publishes = {}
+        full_publishes = {}
+        steps = [
+            BuildStep(
+                "Fetching published file data",
+                functools.partial(
+                    self._fetch_build_data, hook_data, latest_publishes, full_publishes
+                ),
+                abort_on_failure=True,
+                metric="fetch_publishes",
+            ),
+            BuildStep(
+                "Running pre-build actions",
+                lambda: self._bundle.execute_hook_method(
+                    "actions_hook", "pre_build_action", items=hook_data
+                ),
+                abort_on_failure=True,
+                metric="pre_build_hook",
+            ),
+        ]
 
-        actions_to_execute = []
         for item in items_to_process:
+            name = item.data(FileModel.SG_DATA_ROLE).get("name")
             if item.data(FileModel.STATUS_ROLE) == FileModel.STATUS_NOT_LOADED:
                 # the file has not been loaded yet, we want to do it!
-                sg_data = item.data(FileModel.SG_DATA_ROLE)
-                action_name = item.data(FileModel.ACTION_ROLE)
-                loader_actions = self._loader_manager.get_actions_for_publish(
-                    sg_data, self._loader_manager.UI_AREA_MAIN
+                steps.append(
+                    BuildStep(
+                        "Loading %s" % name,
+                        functools.partial(
+                            self._load_item, item, action_cache, full_publishes
+                        ),
+                        items=[item],
+                        metric="loader_actions",
+                    )
                 )
-                for action in loader_actions:
-                    if action["name"] == action_name:
-                        action["sg_publish_data"] = sg_data
-                        actions_to_execute.append(action)
-                        break
             elif item.data(FileModel.STATUS_ROLE) == FileModel.STATUS_OUTDATED:
-                # the file has already been loaded, we want to update to its latest version
+                # the file has already been loaded, we want to update it to its latest version, which is the one the
+                # model item holds
                 scene_obj = item.data(FileModel.BREAKDOWN_DATA_ROLE)
-                self._breakdown_manager.get_latest_published_file(scene_obj)
-                self._breakdown_manager.update_to_latest_version(scene_obj)
+                latest_publishes[get_publish_key(scene_obj.sg_data)] = item.data(
+                    FileModel.SG_DATA_ROLE
+                )
+                steps.append(
+                    BuildStep(
+                        "Updating %s" % name,
+                        functools.partial(
+                            self._update_item,
+                            item,
+                            scene_obj,
+                            latest_publishes,
+                            full_publishes,
+                        ),
+                        items=[item],
+                        metric="breakdown_updates",
+                    )
+                )
 
-        # execute all the actions
-        self._loader_manager.execute_multiple_actions(actions_to_execute)
-        # update the item status now that it is has been loaded/updated
-        for item in items_to_process:
-            self._model.set_status(item, status=FileModel.STATUS_UP_TO_DATE)
+        steps.append(
+            BuildStep(
+                "Processing missing files",
+                lambda: self._bundle.execute_hook_method(
+                    "actions_hook", "process_missing_files", items=items_to_be_deleted
+                ),
+                metric="missing_files_hook",
+            )
+        )
+
+        # the post-build actions are always executed, even if the build is cancelled, and only receive the files
+        # which have been successfully loaded or updated
+        steps.append(
+            BuildStep(
+                "Running post-build actions",
+                lambda: self._bundle.execute_hook_method(
+                    "actions_hook",
+                    "post_build_action",
+                    items=[
+                        data
+                        for item, data in zip(items_to_process, hook_data)
+                        if item in self._build_executor.succeeded_items
+                    ],
+                ),
+                always_run=True,
+                metric="post_build_hook",
+            )
+        )
+
+        self._set_building(True)
+        self._build_executor.run(steps)
+
+    def _fetch_build_data(self, hook_data, latest_publishes, full_publishes):
+        """
+        Fetch the full PTR data of the published files to build and use it in place of the data held by the model.
+        The files which couldn't be fetched, for example because they've been deleted, will fail to build.
+
+        :param hook_data:        List of the dictionaries passed to the actions hook for the files to build
+        :param latest_publishes: Dictionary of the latest published files to update the out-of-date files to
+        :param full_publishes:   Dictionary filled with the fetched published files, where the key is their id
+        """
 
-        self._bundle.execute_hook_method(
-            "actions_hook", "process_missing_files", items=items_to_be_deleted
+        publishes = [data["sg_data"] for data in hook_data if data["sg_data"]]
+        if not publishes:
+            return
+
+        full_publishes.update(
+            fetch_publishes(self._bundle.shotgun, publishes, self._model.build_fields)
         )
-        self._bundle.execute_hook_method(
-            "actions_hook", "post_build_action", items=hook_data
+        for data in hook_data:
+            if data["sg_data"]:
+                data["sg_data"] = full_publishes.get(
+                    data["sg_data"]["id"], data["sg_data"]
+                )
+        for publish_key, sg_data in latest_publishes.items():
+            latest_publishes[publish_key] = full_publishes.get(sg_data["id"], sg_data)
+
+    def _load_item(self, item, action_cache, full_publishes):
+        """
+        Load a file into the scene using the loader action associated to the item.
+
+        :param item:           The :class:`FileModel.FileItem` to load
+        :param action_cache:   Dictionary used to store the loader actions resolved during the build
+        :param full_publishes: Dictionary of the published files fetched with all the fields needed by the loader
+                               actions, where the key is their id
+        """
+
+        # the data held by the model lacks the fields needed by the loader actions
+        sg_data = item.data(FileModel.SG_DATA_ROLE)
+        if sg_data["id"] not in full_publishes:
+            raise sgtk.TankError("Couldn't fetch the data of %s" % sg_data["name"])
+
+        action = resolve_loader_action(
+            self._loader_manager,
+            full_publishes[sg_data["id"]],
+            item.data(FileModel.ACTION_ROLE),
+            action_cache,
+            self._bundle.context,
         )
+        self._loader_manager.execute_multiple_actions([action])
+        self._model.add_loaded_publish(action["sg_publish_data"])
+
+    def _update_item(self, item, scene_obj, latest_publishes, full_publishes):
+        """Update a scene object to the latest version of its published file"""
 
+        # the data held by the model lacks the fields needed by the breakdown manager
+        latest_publish = latest_publishes.get(get_publish_key(scene_obj.sg_data))
+        if latest_publish and latest_publish["id"] not in full_publishes:
+            raise sgtk.TankError(
+                "Couldn't fetch the data of %s" % latest_publish["name"]
+            )
+
+        # the files loaded since the last scan are only known by their PTR data, get their breakdown object
+        publish_key = get_publish_key(scene_obj.sg_data)
+        scene_obj = self._model.resolve_scene_object(scene_obj)
+        if not scene_obj:
+            raise sgtk.TankError(
+                "%s isn't loaded in the scene anymore" % publish_key[2]
+            )
+
+        # re-index the scene object as its PTR data changes when updating it
+        self._model.scene_index.remove(scene_obj)
+        try:
+            # the latest version is only queried if the model doesn't know it
+            updated_objs = update_to_latest_versions(
+                self._breakdown_manager,
+                [(scene_obj, latest_publishes.get(publish_key))],
+                self._bundle.shotgun,
+                self._model.build_fields,
+            )
+        finally:
+            self._model.scene_index.add(scene_obj)
+        if not updated_objs:
+            raise sgtk.TankError(
+                "Couldn't find the latest version of %s" % scene_obj.sg_data["name"]
+            )
+
+    def _set_building(self, building):
+        """Update the UI according to the build state"""
+
+        self._ui.build_button.setEnabled(not building)
+        self._ui.presets.setEnabled(not building)
+        self._ui.extra_presets_button.setEnabled(not building)
+        self._ui.refresh_button.setEnabled(not building)
+        self._ui.check_button.setEnabled(not building)
+        self._ui.uncheck_button.setEnabled(not building)
+        self._ui.cancel_button.setEnabled(True)
+        self._ui.cancel_button.setVisible(building)
+        self._ui.build_progress.setVisible(building)
+
+    def _on_build_step_started(self, step, step_count, description):
+        """
+        Slot triggered when a build step is about to be executed.
+
+        :param step:        Index of the step, starting at 1
+        :param step_count:  Number of steps of the build
+        :param description: Description of the step
+        """
+
+        self._ui.build_progress.setRange(0, step_count)
+        self._ui.build_progress.setValue(step - 1)
+        self._ui.build_status.setText(
+            "%s (%.1f items/s)" % (description, self._build_executor.throughput)
+        )
+
+    def _on_build_finished(self, cancelled):
+        """
+        Slot triggered once the build is over. Only the items which have been successfully built are flagged as
+        up-to-date.
+
+        :param cancelled: True if the build has been cancelled
+        """
+
+        self._model.set_statuses(
+            self._build_executor.succeeded_items, FileModel.STATUS_UP_TO_DATE
+        )
+
+        if self._build_executor.aborted:
+            state = "aborted"
+        elif cancelled:
+            state = "cancelled"
+        else:
+            state = "completed"
+        self._ui.build_status.setText(
+            "Build %s: %s file(s) built, %s failed (%.1f items/s)"
+            % (
+                state,
+                len(self._build_executor.succeeded_items),
+                len(self._build_executor.failed_items),
+                self._build_executor.throughput,
+            )
+        )
+        self._set_building(False)
         self._ui.view.expandAll()
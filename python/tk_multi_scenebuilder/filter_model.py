@@ -0,0 +1,113 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from sgtk.platform.qt import QtGui
+
+from .model import FileModel
+
+
+class FileFilterProxyModel(QtGui.QSortFilterProxyModel):
+    """
+    Proxy model filtering the files of a :class:`FileModel` by text, status and published file type.
+
+    The matching items are looked up once in the search index of the model every time the filter or the index
+    changes, so accepting a row only costs a set lookup.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Class constructor.
+
+        :param parent: The parent QObject for this instance
+        """
+
+        QtGui.QSortFilterProxyModel.__init__(self, parent)
+
+        self._text = ""
+        self._statuses = None
+        self._type_names = None
+
+        # items matching the filter, along with the version of the search index they have been computed from
+        self._matches = None
+        self._match_statuses = None
+        self._index_version = None
+
+    @property
+    def is_filtering(self):
+        """True if a filter is set."""
+        return bool(
+            self._text.strip()
+            or self._statuses is not None
+            or self._type_names is not None
+        )
+
+    def set_filter(self, text="", statuses=None, type_names=None):
+        """
+        Filter the files of the model.
+
+        :param text:       Text the files must match. Each word of the text must be found in the entity name, name,
+                           type or version of the published file.
+        :param statuses:   List of the statuses the files must have, None to accept all the statuses
+        :param type_names: List of the published file types the files must have, None to accept all the types
+        """
+
+        self._text = text
+        self._statuses = statuses
+        self._type_names = type_names
+        self._index_version = None
+        self.invalidateFilter()
+
+    def filtered_items(self):
+        """
+        Get the files matching the filter.
+
+        :returns: A list of :class:`FileModel.FileItem`
+        """
+
+        model = self.sourceModel()
+        if not self.is_filtering:
+            return [
+                item
+                for row in range(model.rowCount())
+                for item in model.item_from_index(model.index(row, 0)).items
+            ]
+
+        self._update_matches()
+        return [item for item in self._matches if item.group]
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        """
+        Override the :class:`sgtk.platform.qt.QtGui.QSortFilterProxyModel` method.
+        A group is accepted if some of its files match the filter.
+        """
+
+        if not self.is_filtering:
+            return True
+
+        self._update_matches()
+        model = self.sourceModel()
+        item = model.item_from_index(model.index(source_row, 0, source_parent))
+        if isinstance(item, FileModel.GroupItem):
+            return item.status in self._match_statuses
+        return item in self._matches
+
+    def _update_matches(self):
+        """Search the matching items again if the filter or the search index has changed"""
+
+        search_index = self.sourceModel().search_index
+        index_version = (id(search_index), search_index.version)
+        if self._index_version == index_version:
+            return
+
+        self._matches = search_index.search(
+            self._text, self._statuses, self._type_names
+        )
+        self._match_statuses = set(item.status for item in self._matches)
+        self._index_version = index_version
@@ -0,0 +1,138 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import logging
+import time
+
+
+class Metrics(object):
+    """
+    Record the duration of the different phases of the load and build processes, along with some counts like the
+    number of published files fetched or the number of loader actions executed.
+
+    The timings are logged through the bundle logger at debug level and dispatched to the metrics hook. When neither
+    the debug logs nor the hook are enabled, recording a timing is a no-op.
+    """
+
+    def __init__(self, bundle):
+        """
+        Class constructor.
+
+        :param bundle: The Scene Builder application instance
+        """
+        self._bundle = bundle
+        self._log_enabled = bundle.logger.isEnabledFor(logging.DEBUG)
+        self._hook_enabled = bool(
+            bundle.execute_hook_method("metrics_hook", "is_enabled")
+        )
+        self.enabled = self._log_enabled or self._hook_enabled
+
+    def span(self, name, **counts):
+        """
+        Get a context manager recording the time spent in its block.
+
+        :param name:   Name of the timed phase
+        :param counts: Counts associated to the phase. More counts can be added while the block is running using
+                       :meth:`Span.count`.
+        :returns: A :class:`Span`
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, counts)
+
+    def record(self, name, duration, **counts):
+        """
+        Record the duration of a phase which has already been measured.
+
+        :param name:     Name of the timed phase
+        :param duration: Duration of the phase, in seconds
+        :param counts:   Counts associated to the phase
+        """
+        if not self.enabled:
+            return
+
+        if self._log_enabled:
+            self._bundle.logger.debug(
+                "Scene Builder: %s took %.3fs%s"
+                % (
+                    name,
+                    duration,
+                    "".join(" %s=%s" % (k, counts[k]) for k in sorted(counts)),
+                )
+            )
+
+        if self._hook_enabled:
+            try:
+                self._bundle.execute_hook_method(
+                    "metrics_hook",
+                    "record_span",
+                    name=name,
+                    duration=duration,
+                    counts=counts,
+                )
+            except Exception:
+                # the metrics must never break the load or the build
+                self._bundle.logger.exception("Couldn't record metrics for %s" % name)
+
+
+class Span(object):
+    """Context manager recording the time spent in its block"""
+
+    __slots__ = ("_metrics", "_name", "_counts", "_start_time")
+
+    def __init__(self, metrics, name, counts):
+        """
+        Class constructor.
+
+        :param metrics: The :class:`Metrics` instance to record the timing with
+        :param name:    Name of the timed phase
+        :param counts:  Counts associated to the phase
+        """
+        self._metrics = metrics
+        self._name = name
+        self._counts = counts
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.record(
+            self._name, time.perf_counter() - self._start_time, **self._counts
+        )
+        return False
+
+    def count(self, name, value):
+        """
+        Set a count associated to the phase.
+
+        :param name:  Name of the count
+        :param value: Value of the count
+        """
+        self._counts[name] = value
+
+
+class _NullSpan(object):
+    """Span used when the metrics are disabled, doing nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def count(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
@@ -8,10 +8,22 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import collections
+import datetime
+import os
+import sqlite3
+import time
+
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
-from .utils import resolve_filters
+from . import builder
+from .cache import QueryCache, get_cache_key, get_results_digest, get_stable_data
+from .metrics import Metrics
+from .query import PUBLISH_LIST_FIELDS, PresetCompiler, find_latest_publishes
+from .scene_index import LoadedPublish, SceneIndex, get_publish_key
+from .search_index import SearchIndex
+from .utils import combine_presets, get_preset_name
 
 shotgun_data = sgtk.platform.import_framework(
     "tk-framework-shotgunutils", "shotgun_data"
@@ -22,10 +34,14 @@ delegates = sgtk.platform.import_framework("tk-framework-qtwidgets", "delegates"
 ViewItemRolesMixin = delegates.ViewItemRolesMixin
 
 
-class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
+class FileModel(QtCore.QAbstractItemModel, ViewItemRolesMixin):
     """
     The FileModel maintains a model of all the Published Files found when querying PTR according to the settings defined
-    in the config. Each Published File is represented by a row in the model where the columns are PTR fields.
+    in the config. Each Published File is represented by a row in the model, grouped under a parent row according to
+    its status.
+
+    The model data is stored in compact records rather than in :class:`sgtk.platform.qt.QtGui.QStandardItem`, so
+    presets with tens of thousands of published files can be loaded without allocating one Qt item per row.
     """
 
     _BASE_ROLE = QtCore.Qt.UserRole + 32
@@ -39,7 +55,10 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
         NEXT_AVAILABLE_ROLE,
     ) = range(_BASE_ROLE, _BASE_ROLE + 7)
 
-    STATUS_UP_TO_DATE, STATUS_OUTDATED, STATUS_NOT_LOADED, STATUS_INVALID = range(4)
+    STATUS_UP_TO_DATE = builder.STATUS_UP_TO_DATE
+    STATUS_OUTDATED = builder.STATUS_OUTDATED
+    STATUS_NOT_LOADED = builder.STATUS_NOT_LOADED
+    STATUS_INVALID = builder.STATUS_INVALID
 
     GROUP_NAMES = {
         STATUS_UP_TO_DATE: "Loaded",
@@ -63,18 +82,21 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
     # Signal emitted when all data loaded
     data_loaded = QtCore.Signal()
 
-    class GroupItem(QtGui.QStandardItem):
-        """Model item to group PublishedFiles together according to their status"""
+    class GroupItem(object):
+        """Model record to group PublishedFiles together according to their status"""
+
+        __slots__ = ("status", "name", "text", "items", "row")
 
         def __init__(self, status):
             """Class constructor"""
-            self.__status = status
-            self.__name = FileModel.GROUP_NAMES.get(status)
-            super(FileModel.GroupItem, self).__init__()
+            self.status = status
+            self.name = FileModel.GROUP_NAMES.get(status)
+            self.text = f"<b>{self.name}</b>"
+            self.items = []
+            self.row = None
 
         def data(self, role):
             """
-            Override the :class:`sgtk.platform.qt.QtGui.QStandardItem` method.
             Return the data for the item for the specified role.
 
             :param role: The :class:`sgtk.platform.qt.QtCore.Qt.ItemDataRole` role.
@@ -82,27 +104,74 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
             """
 
             if role == FileModel.TEXT_ROLE:
-                return f"<b>{self.__name}</b>"
+                return self.text
 
             elif role == FileModel.TYPE_ROLE:
                 return FileModel.GROUP_TYPE
 
             elif role == FileModel.STATUS_ROLE:
-                return self.__status
-
-            return super(FileModel.GroupItem, self).data(role)
-
-    class FileItem(QtGui.QStandardItem):
-        """Model item to represent PublishedFile entry"""
+                return self.status
+
+            return None
+
+        def rowCount(self):
+            """Return the number of FileItems in the group"""
+            return len(self.items)
+
+    class FileItem(object):
+        """Model record to represent PublishedFile entry"""
+
+        __slots__ = (
+            "_sg_data",
+            "_text",
+            "status",
+            "check_state",
+            "action_name",
+            "scene_obj",
+            "icon",
+            "group",
+            "row",
+            "claims",
+        )
 
         def __init__(self, sg_data):
             """Class constructor"""
-            self.__sg_data = sg_data
-            super(FileModel.FileItem, self).__init__()
+            self.sg_data = sg_data
+            self.status = None
+            self.check_state = QtCore.Qt.Checked
+            self.action_name = None
+            self.scene_obj = None
+            self.icon = None
+            self.group = None
+            self.row = None
+            # (loader action, published file) tuple of each preset action matching the file, keyed by action position
+            self.claims = {}
+
+        @property
+        def sg_data(self):
+            """Dictionary of PTR data representing the published file"""
+            return self._sg_data
+
+        @sg_data.setter
+        def sg_data(self, sg_data):
+            self._sg_data = sg_data
+            # the text displayed by the view is rendered from the PTR data, it needs to be rendered again
+            self._text = None
+
+        @property
+        def text(self):
+            """The text displayed by the view for this item, rendered once and cached"""
+            if self._text is None:
+                self._text = f"""
+                <span style='color: #18A7E3;'>Entity</span> {self._sg_data.get('entity', {}).get('name')}<br/>
+                <span style='color: #18A7E3;'>Name</span> {self._sg_data.get('name', "")}<br/>
+                <span style='color: #18A7E3;'>Type</span> {self._sg_data.get('published_file_type', {}).get('name')}<br/>
+                <span style='color: #18A7E3;'>Version</span> {self._sg_data.get('version_number')}<br/>
+                """
+            return self._text
 
         def data(self, role):
             """
-            Override the :class:`sgtk.platform.qt.QtGui.QStandardItem` method.
             Return the data for the item for the specified role.
 
             :param role: The :class:`sgtk.platform.qt.QtCore.Qt.ItemDataRole` role.
@@ -110,20 +179,71 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
             """
 
             if role == FileModel.TEXT_ROLE:
-                return f"""
-                <span style='color: #18A7E3;'>Entity</span> {self.__sg_data.get('entity', {}).get('name')}<br/>
-                <span style='color: #18A7E3;'>Name</span> {self.__sg_data.get('name', "")}<br/>
-                <span style='color: #18A7E3;'>Type</span> {self.__sg_data.get('published_file_type', {}).get('name')}<br/>
-                <span style='color: #18A7E3;'>Version</span> {self.__sg_data.get('version_number')}<br/>
-                """
+                return self.text
 
             elif role == FileModel.SG_DATA_ROLE:
-                return self.__sg_data
+                return self.sg_data
 
             elif role == FileModel.TYPE_ROLE:
                 return FileModel.FILE_TYPE
 
-            return super(FileModel.FileItem, self).data(role)
+            elif role == FileModel.STATUS_ROLE:
+                return self.status
+
+            elif role == FileModel.ACTION_ROLE:
+                return self.action_name
+
+            elif role == FileModel.BREAKDOWN_DATA_ROLE:
+                return self.scene_obj
+
+            elif role == QtCore.Qt.CheckStateRole:
+                return self.check_state
+
+            elif role == QtCore.Qt.DecorationRole:
+                return self.icon
+
+            return None
+
+        def parent(self):
+            """Return the GroupItem the item belongs to, None if the item hasn't been added to the model yet"""
+            return self.group
+
+    class PresetData(object):
+        """Data of a preset kept in memory, so the model can switch back to it without running any PTR query"""
+
+        __slots__ = (
+            "queries",
+            "query_results",
+            "last_sync",
+            "groups",
+            "query_items",
+            "publish_items",
+            "orphan_items",
+            "search_index",
+            "scene_index",
+            "scene_version",
+        )
+
+        def __init__(self, queries, query_results, last_sync):
+            """
+            Class constructor.
+
+            :param queries:       List of the :class:`PresetQuery` of the preset
+            :param query_results: Dictionary of the published files returned by each query, keyed by query key
+            :param last_sync:     Dictionary of the last update time of each query, keyed by query key
+            """
+            self.queries = queries
+            self.query_results = query_results
+            self.last_sync = last_sync
+            # the model items, only available if the preset has already been displayed, along with the scene index
+            # used to compute their status
+            self.groups = None
+            self.query_items = None
+            self.publish_items = None
+            self.orphan_items = None
+            self.search_index = None
+            self.scene_index = None
+            self.scene_version = None
 
     def __init__(self, parent, bg_task_manager, loader_app, breakdown_manager):
         """
@@ -136,15 +256,85 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
         :param breakdown_manager:
         """
 
-        QtGui.QStandardItemModel.__init__(self, parent)
+        QtCore.QAbstractItemModel.__init__(self, parent)
 
-        self._scene_objs = []
+        self._scene_index = SceneIndex()
+        # the scene is only scanned again if the context changed or if the scan has been invalidated
+        self._scene_scan_context = None
         self._pending_requests = {}
+        self._thumbnail_requests = {}
+        self._generation = 0
+        self._groups = []
         self._parent_items = {}
+        self._query_items = {}
+        # global identity index of the items, keyed by published file key, and items of the scene objects which aren't
+        # part of the preset anymore, keyed by published file id
+        self._publish_items = {}
+        self._orphan_items = {}
+        self._search_index = SearchIndex()
+        self._query_results = {}
+        self._last_sync = {}
+        self._queries = []
+        # results of the queries executed in several parts, as a [remaining parts, {id: published file}] list
+        self._partial_results = {}
+        self._preset_name = None
+        self._load_start_time = None
+
+        # the data of the last presets used is kept in memory, and the other presets are prefetched in the background
+        # once the current one is loaded, so switching presets doesn't need to wait for PTR
+        self._preset_cache = collections.OrderedDict()
+        self._prefetch_requests = {}
+        self._prefetch_results = {}
+        self._prefetched_presets = set()
 
         self._bundle = sgtk.platform.current_bundle()
+
+        # timings of the load phases, only recorded if the metrics are enabled
+        self._metrics = Metrics(self._bundle)
+        self._query_start_times = {}
+        self._grouping_time = 0.0
+        self._thumbnail_request_count = 0
         self._loader_app = loader_app
         self._breakdown_manager = breakdown_manager
+        self._preset_cache_size = self._bundle.get_setting("preset_cache_size")
+
+        # the presets are compiled into query plans once per context. Only the fields needed to display the files are
+        # queried, the PTR fields needed by the loader application to perform its actions are fetched at build time.
+        self._compiler = PresetCompiler(
+            self._bundle.get_setting("presets"),
+            PUBLISH_LIST_FIELDS,
+            [{"field_name": "version_number", "direction": "desc"}],
+            logger=self._bundle.logger,
+        )
+        self._build_fields = self._loader_app.import_module(
+            "tk_multi_loader.constants"
+        ).PUBLISHED_FILES_FIELDS + ["published_file_type", "updated_at"]
+
+        # the query cache is used to populate the model instantly with the results of the previous session while the
+        # PTR queries are run again in the background
+        self._query_cache = None
+        cache_max_size = self._bundle.get_setting("query_cache_max_size")
+        if cache_max_size:
+            cache_path = os.path.join(self._bundle.cache_location, "query_cache.db")
+            try:
+                self._query_cache = QueryCache(cache_path, cache_max_size * 1024 * 1024)
+            except (OSError, sqlite3.Error) as e:
+                self._bundle.logger.warning(
+                    "File Model: Couldn't open query cache %s: %s" % (cache_path, e)
+                )
+
+        # query results are processed in small chunks, so we don't freeze the UI when dealing with lots of published
+        # files: each chunk is processed within a time budget and the items are inserted or moved to their new group
+        # in batches at the end of it
+        self._ingestion_jobs = []
+        self._items_to_insert = []
+        self._items_to_move = []
+        self._ingestion_budget = (
+            self._bundle.get_setting("model_update_budget") / 1000.0
+        )
+        self._ingestion_timer = QtCore.QTimer(self)
+        self._ingestion_timer.setInterval(0)
+        self._ingestion_timer.timeout.connect(self._process_ingestion_jobs)
 
         # sg data retriever is used to download thumbnails and perform PTR queries in the background
         self._sg_data_retriever = ShotgunDataRetriever(bg_task_manager=bg_task_manager)
@@ -159,13 +349,281 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
         # Add additional roles defined by the ViewItemRolesMixin class.
         self.NEXT_AVAILABLE_ROLE = self.initialize_roles(self.NEXT_AVAILABLE_ROLE)
 
+    ################################################################################################
+    # QAbstractItemModel implementation
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the index of the item in the model specified by the given row, column and parent index.
+
+        Group rows use 0 as internal id while file rows use the status of their group plus one, so the parent of a
+        file row can be found without storing any pointer in the index.
+        """
+
+        if column != 0 or row < 0:
+            return QtCore.QModelIndex()
+
+        if not parent.isValid():
+            if row >= len(self._groups):
+                return QtCore.QModelIndex()
+            return self.createIndex(row, column, 0)
+
+        if parent.internalId() != 0 or parent.row() >= len(self._groups):
+            return QtCore.QModelIndex()
+        group = self._groups[parent.row()]
+        if row >= len(group.items):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, group.status + 1)
+
+    def parent(self, index):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the parent of the model item with the given index.
+        """
+
+        if not index.isValid() or index.internalId() == 0:
+            return QtCore.QModelIndex()
+        group = self._parent_items.get(index.internalId() - 1)
+        if not group:
+            return QtCore.QModelIndex()
+        return self.createIndex(group.row, 0, 0)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the number of rows under the given parent.
+        """
+
+        if not parent.isValid():
+            return len(self._groups)
+        if parent.internalId() != 0 or parent.row() >= len(self._groups):
+            return 0
+        return len(self._groups[parent.row()].items)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the number of columns for the children of the given parent.
+        """
+        return 1
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the data stored under the given role for the item referred to by the index.
+        """
+
+        item = self.item_from_index(index)
+        if not item:
+            return None
+        return item.data(role)
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Only the check state of the file items can be edited.
+        """
+
+        item = self.item_from_index(index)
+        if not isinstance(item, FileModel.FileItem) or role != QtCore.Qt.CheckStateRole:
+            return False
+        item.check_state = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QAbstractItemModel` method.
+        Return the item flags for the given index.
+        """
+
+        item = self.item_from_index(index)
+        if not item:
+            return QtCore.Qt.NoItemFlags
+        if isinstance(item, FileModel.GroupItem):
+            return QtCore.Qt.ItemIsEnabled
+        return (
+            QtCore.Qt.ItemIsEnabled
+            | QtCore.Qt.ItemIsSelectable
+            | QtCore.Qt.ItemIsUserCheckable
+        )
+
+    ################################################################################################
+    # public interface
+
+    def item_from_index(self, index):
+        """
+        Get the model record referred to by the given index.
+
+        :param index: The :class:`sgtk.platform.qt.QtCore.QModelIndex` of the item
+        :returns: A :class:`FileModel.GroupItem` or a :class:`FileModel.FileItem`, None if the index isn't valid
+        """
+
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            if index.row() >= len(self._groups):
+                return None
+            return self._groups[index.row()]
+        group = self._parent_items.get(index.internalId() - 1)
+        if not group or index.row() >= len(group.items):
+            return None
+        return group.items[index.row()]
+
+    def index_from_item(self, item):
+        """
+        Get the index of a model record.
+
+        :param item: A :class:`FileModel.GroupItem` or a :class:`FileModel.FileItem`
+        :returns: The :class:`sgtk.platform.qt.QtCore.QModelIndex` of the item, an invalid index if the item isn't
+            part of the model
+        """
+
+        if item.row is None:
+            return QtCore.QModelIndex()
+        if isinstance(item, FileModel.GroupItem):
+            return self.createIndex(item.row, 0, 0)
+        if not item.group:
+            return QtCore.QModelIndex()
+        return self.createIndex(item.row, 0, item.group.status + 1)
+
     def clear(self):
-        """Clear the model data"""
+        """Clear the model data. The data of the current preset is kept in memory if it has been fully loaded."""
+
+        self._store_current_preset()
+        self._preset_name = None
+        self.cancel_pending_requests()
 
+        self.beginResetModel()
+        self._groups = []
         self._parent_items = {}
+        self._query_items = {}
+        # global identity index of the items, keyed by published file key, and items of the scene objects which aren't
+        # part of the preset anymore, keyed by published file id
+        self._publish_items = {}
+        self._orphan_items = {}
+        self._search_index = SearchIndex()
+        self._query_results = {}
+        self._last_sync = {}
+        self._queries = []
+
+        self._ingestion_timer.stop()
+        self._ingestion_jobs = []
+        self._items_to_insert = []
+        self._items_to_move = []
+        self.endResetModel()
+
+    def cancel_pending_requests(self):
+        """
+        Cancel all the queries and thumbnail downloads in progress. Their results will be discarded even if the
+        background tasks couldn't be stopped in time.
+        """
+
+        # any result received from now on belongs to a previous generation and will be ignored
+        self._generation += 1
+
+        if self._sg_data_retriever:
+            for uid in self._pending_requests:
+                self._sg_data_retriever.stop_work(uid)
         self._pending_requests = {}
+        self._thumbnail_requests = {}
+
+    @property
+    def search_index(self):
+        """The :class:`SearchIndex` of the items of the model, used to filter them."""
+        return self._search_index
 
-        super().clear()
+    def set_check_states(self, items, check_state):
+        """
+        Set the check state of several items at once, notifying the views with a single change per group.
+
+        :param items:       List of :class:`FileModel.FileItem`
+        :param check_state: The :class:`sgtk.platform.qt.QtCore.Qt.CheckState` to set
+        """
+
+        changed_rows = {}
+        for item in items:
+            if item.check_state == check_state:
+                continue
+            item.check_state = check_state
+            if item.group:
+                changed_rows.setdefault(item.group, []).append(item.row)
+
+        for group, rows in changed_rows.items():
+            group_index = self.index_from_item(group)
+            self.dataChanged.emit(
+                self.index(min(rows), 0, group_index),
+                self.index(max(rows), 0, group_index),
+            )
+
+    @property
+    def scene_index(self):
+        """The :class:`SceneIndex` of the objects loaded in the current scene."""
+        return self._scene_index
+
+    def invalidate_scene_scan(self):
+        """Force the scene to be scanned again on the next load or refresh, for example after opening a new scene"""
+        self._scene_scan_context = None
+
+    def add_loaded_publish(self, sg_data):
+        """
+        Register a published file which has just been loaded into the scene, so the scene doesn't need to be scanned
+        again to know about it.
+
+        :param sg_data: Dictionary of PTR data representing the loaded published file
+        """
+        self._scene_index.add(LoadedPublish(sg_data))
+
+    def resolve_scene_object(self, scene_obj):
+        """
+        Get the breakdown object of a published file loaded in the scene. Published files registered using
+        :meth:`add_loaded_publish` are only known by their PTR data, the scene is scanned again to get their breakdown
+        object.
+
+        :param scene_obj: Scene object, as stored in the :class:`SceneIndex`
+        :returns: The breakdown object, None if the published file isn't loaded anymore
+        """
+        if not isinstance(scene_obj, LoadedPublish):
+            return scene_obj
+        self.invalidate_scene_scan()
+        self._scan_scene()
+        return self._scene_index.get(scene_obj.sg_data["id"])
+
+    def _get_scene_scan_key(self):
+        """
+        Get the key identifying the scene scans which can be reused: the scene is scanned again when the context
+        changes, even if the engine changes it back to the same context, as another scene may have been opened.
+        """
+        return (str(self._bundle.context), self._bundle.context_change_count)
+
+    def _scan_scene(self):
+        """
+        Scan the scene to index the published files it contains, unless it has already been scanned for the current
+        context.
+
+        :returns: True if the scene has been scanned, False if the previous scan has been reused
+        """
+
+        scan_key = self._get_scene_scan_key()
+        if self._scene_scan_context == scan_key:
+            return False
+
+        with self._metrics.span("scan_scene") as span:
+            self._scene_index = SceneIndex(self._breakdown_manager.scan_scene())
+            span.count("scene_objects", len(self._scene_index))
+        self._scene_scan_context = scan_key
+        return True
+
+    @property
+    def query_fields(self):
+        """The PTR fields queried to populate the model."""
+        return self._compiler.fields
+
+    @property
+    def build_fields(self):
+        """The PTR fields needed by the loader and breakdown actions to load or update a published file."""
+        return list(self._build_fields)
 
     def destroy(self):
         """
@@ -175,6 +633,12 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
 
         # clear the model
         self.clear()
+        self._preset_cache.clear()
+        self._cancel_prefetch()
+
+        if self._query_cache:
+            self._query_cache.close()
+            self._query_cache = None
 
         # stop the data retriever
         if self._sg_data_retriever:
@@ -182,47 +646,172 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
             self._sg_data_retriever.deleteLater()
             self._sg_data_retriever = None
 
+    def invalidate_cache(self, preset_name=None):
+        """
+        Remove the cached query results.
+
+        :param preset_name: Name of the preset to invalidate the cache for. If None, the whole cache is cleared.
+        """
+        if self._query_cache:
+            try:
+                self._query_cache.invalidate(preset_name)
+            except sqlite3.Error as e:
+                self._disable_query_cache(e)
+        if preset_name is None:
+            self._preset_cache.clear()
+        else:
+            self._preset_cache.pop(preset_name, None)
+
     def load_data(self, preset_name):
         """
-        Load the model data
+        Load the model data. If some results have been cached for this preset, they're used to populate the model
+        straight away, and the model is then updated once the PTR queries have completed.
 
-        :param preset_name:  Name of the preset we want to load data for
+        Several presets can be loaded together, in which case the model holds the union of their published files. A
+        published file matched by several presets is only listed once, using the loader action of the first preset
+        matching it.
+
+        :param preset_name:  Name of the preset we want to load data for, or list of the names of the presets
         """
 
+        preset_names = preset_name
+        preset_name = get_preset_name(preset_names) if preset_names else None
+        reload = preset_name == self._preset_name
         self.clear()
+        if reload:
+            # loading the current preset again always runs the full PTR queries
+            self._preset_cache.pop(preset_name, None)
+        self._preset_name = preset_name
+        self._load_start_time = time.perf_counter()
+        self._query_start_times = {}
+        self._partial_results = {}
+        self._grouping_time = 0.0
+        self._thumbnail_request_count = 0
 
         if not preset_name:
             return
 
-        # scan the scene to get all the already loaded items
-        # TODO: should we move this to the model constructor?
-        self._scene_objs = self._breakdown_manager.scan_scene()
+        # the preset is being prefetched, we're going to load it straight away instead
+        self._cancel_prefetch(preset_name)
 
-        for preset in self._bundle.get_setting("presets"):
+        preset_data = self._preset_cache.pop(preset_name, None)
+        if preset_data:
+            self._restore_preset(preset_data)
+            return
 
-            if preset["name"] != preset_name:
-                continue
+        preset = combine_presets(self._bundle.get_setting("presets"), preset_names)
+        if preset:
 
-            for action in preset["actions"]:
+            latest_versions_only = self._bundle.get_setting("latest_versions_only")
+            scan_needed = self._scene_scan_context != self._get_scene_scan_key()
 
-                publish_type_filters = [
-                    "published_file_type.PublishedFileType.code",
-                    "in",
-                    list(action["action_mappings"].keys()),
-                ]
+            # fold all the preset actions into as few PTR queries as possible and execute them in the background
+            with self._metrics.span("plan_queries") as span:
+                self._queries = self._compiler.compile(
+                    self._bundle.shotgun, preset, self._bundle.context
+                )
+                span.count("queries", len(self._queries))
+
+            # the queries are submitted before scanning the scene, so they run in background threads while the scene
+            # is scanned. Their results are only processed once the scan is done, as the events are processed.
+            for query in self._queries:
+                if latest_versions_only:
+                    # the published files loaded in the scene aren't known until the scene is scanned, in which case
+                    # they're queried separately
+                    find_uid = self._sg_data_retriever.execute_method(
+                        find_latest_publishes,
+                        query,
+                        None if scan_needed else self._scene_index.publish_ids,
+                    )
+                else:
+                    find_uid = self._sg_data_retriever.execute_find(
+                        "PublishedFile", query.filters, query.fields, query.order
+                    )
+                self._add_query_request(find_uid, query, False)
+
+            # get all the already loaded items, only scanning the scene if it may have changed since the last load
+            self._scan_scene()
+
+            loaded_publish_ids = self._scene_index.publish_ids
+            if latest_versions_only and scan_needed and loaded_publish_ids:
+                for query in self._queries:
+                    find_uid = self._sg_data_retriever.execute_find(
+                        "PublishedFile",
+                        query.filters + [["id", "in", loaded_publish_ids]],
+                        query.fields,
+                        query.order,
+                    )
+                    self._add_query_request(find_uid, query, False)
+                    # both results are merged before being processed
+                    self._partial_results[query.key] = [2, {}]
+
+            # populate the model with the cached results, if any, while the queries are executed again
+            if self._query_cache:
+                for query in self._queries:
+                    try:
+                        cached_publishes = self._query_cache.get(
+                            self._get_cache_key(query)
+                        )
+                    except sqlite3.Error as e:
+                        self._disable_query_cache(e)
+                        break
+                    if cached_publishes is not None:
+                        self._queue_query_results(query, cached_publishes)
+
+    def refresh(self):
+        """
+        Refresh the model data, only querying the published files which have been created or updated since the
+        last time the queries of the current preset have been run. The existing items are updated in place, so
+        their check state and thumbnail are preserved.
 
-                # ensure we have all the PTR fields needed by the loader application to perform its actions
-                fields = self._loader_app.import_module(
-                    "tk_multi_loader.constants"
-                ).PUBLISHED_FILES_FIELDS + ["published_file_type"]
-                filters = resolve_filters(action["context"]) + [publish_type_filters]
-                order = [{"field_name": "version_number", "direction": "desc"}]
+        The scene is scanned again, and the status of the existing items is updated if its content has changed.
 
-                # execute PTR query in the background
-                find_uid = self._sg_data_retriever.execute_find(
-                    "PublishedFile", filters, fields, order
-                )
-                self._pending_requests[find_uid] = action["action_mappings"]
+        Published files which have been deleted since the last load are only removed by a full reload, using
+        :meth:`load_data`.
+        """
+
+        loaded_publish_ids = set(self._scene_index.publish_ids)
+        self.invalidate_scene_scan()
+        self._scan_scene()
+        if set(self._scene_index.publish_ids) != loaded_publish_ids:
+            for query in self._queries:
+                if query.key in self._query_results:
+                    self._queue_query_results(query, self._query_results[query.key])
+
+        self._refresh_queries()
+
+    def is_preset_loaded(self, preset_name):
+        """
+        Check if the data of a preset is available in memory, in which case loading it is instantaneous.
+
+        :param preset_name: Name of the preset, or list of the names of the presets loaded together
+        :returns: True if the preset data is in memory, False otherwise
+        """
+        return get_preset_name(preset_name) in self._preset_cache
+
+    def _refresh_queries(self):
+        """Run the queries of the current preset again, only retrieving the published files updated since the last sync"""
+
+        for query in self._queries:
+
+            last_sync = self._last_sync.get(query.key)
+            if not last_sync:
+                # the query has never completed, there is nothing to refresh
+                continue
+
+            # go back one second in time as PTR timestamps don't store sub-second values, the published files
+            # we already know about are merged with the existing ones anyway
+            filters = query.filters + [
+                [
+                    "updated_at",
+                    "greater_than",
+                    last_sync - datetime.timedelta(seconds=1),
+                ]
+            ]
+            find_uid = self._sg_data_retriever.execute_find(
+                "PublishedFile", filters, query.fields, query.order
+            )
+            self._add_query_request(find_uid, query, True)
 
     def _on_data_retriever_work_completed(self, uid, request_type, data):
         """
@@ -235,81 +824,100 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
         :param data:            The result from completing the work
         """
 
-        if uid not in self._pending_requests:
+        if uid in self._prefetch_requests:
+            self._on_prefetch_completed(
+                uid, self._get_query_results(request_type, data)
+            )
             return
 
-        if request_type == "find":
+        if uid not in self._pending_requests:
+            return
 
-            publishes = {}
-            action_mappings = self._pending_requests.pop(uid)
+        generation, request = self._pending_requests[uid]
+        if generation != self._generation:
+            # the request belongs to a previous load, discard its results before doing anything with them
+            del self._pending_requests[uid]
+            return
 
-            # first, go through each published files to check if they have already been loaded to the scene
-            # NOTE this routine depends on the published files sorted in descending order of version number,
-            # e.g. latest version first, so that we can create the FileItem with the first published file
-            # that is encountered
-            for publish in data["sg"]:
+        if request_type in ["find", "method"]:
 
-                action_name = action_mappings.get(
-                    publish["published_file_type"]["name"]
+            del self._pending_requests[uid]
+            query, refresh = request
+            publishes = self._get_query_results(request_type, data)
+
+            start_time = self._query_start_times.pop(uid, None)
+            if start_time is not None:
+                self._metrics.record(
+                    "ptr_query",
+                    time.perf_counter() - start_time,
+                    rows_fetched=len(publishes),
+                    refresh=refresh,
                 )
 
-                # make sure we're only keeping the latest version of each file and not the whole history
-                publishes_by_task = publishes.setdefault(publish["task"]["id"], {})
-                publishes_by_type = publishes_by_task.setdefault(
-                    publish["published_file_type"]["id"], {}
+            partial_results = self._partial_results.get(query.key)
+            if partial_results and not refresh:
+                # the query has been executed in several parts, wait for all of them before processing the results
+                partial_results[0] -= 1
+                partial_results[1].update((p["id"], p) for p in publishes)
+                if partial_results[0]:
+                    return
+                del self._partial_results[query.key]
+                publishes = sorted(
+                    partial_results[1].values(),
+                    key=lambda p: p.get("version_number") or 0,
+                    reverse=True,
                 )
-                publish_item = publishes_by_type.setdefault(publish["name"], None)
 
-                if publish_item:
-                    # We already have a publish item, make sure its status is correctly set
-                    self.set_status(publish_item, publish)
-                else:
-                    # No publish item exists, create the FileItem with the latest version of the published file
-                    publish_item = FileModel.FileItem(publish)
-                    publish_item.setData(QtCore.Qt.Checked, QtCore.Qt.CheckStateRole)
-                    publish_item.setData(action_name, self.ACTION_ROLE)
-                    self.set_status(publish_item, publish)
-                    self._set_parent(publish_item)
-                    publishes_by_type[publish["name"]] = publish_item
-
-                    # get the thumbnail
-                    thumbnail_id = self._sg_data_retriever.request_thumbnail(
-                        publish["image"], publish["type"], publish["id"], "image"
-                    )
-                    self._pending_requests[thumbnail_id] = publish_item
-
-            # now, we need to take care of the object already loaded to the scene that is not associated to it anymore
-            for obj in self._scene_objs:
-
-                publishes_by_task = publishes.get(obj.sg_data["task"]["id"], {})
-                publishes_by_type = publishes_by_task.get(
-                    obj.sg_data["published_file_type"]["id"], {}
+            if refresh:
+                if not publishes:
+                    self._emit_data_loaded_if_done()
+                    return
+                # merge the published files created or updated since the last sync with the ones we already have
+                publishes_by_id = {
+                    p["id"]: p for p in self._query_results.get(query.key, [])
+                }
+                publishes_by_id.update((p["id"], p) for p in publishes)
+                publishes = sorted(
+                    publishes_by_id.values(),
+                    key=lambda p: p.get("version_number") or 0,
+                    reverse=True,
                 )
-                publish_item = publishes_by_type.get(obj.sg_data["name"], None)
 
-                # the scene element doesn't have an associated publish file, we need to flag it to be removed
-                if not publish_item:
-
-                    publish_item = FileModel.FileItem(obj.sg_data)
-                    publish_item.setData(QtCore.Qt.Checked, QtCore.Qt.CheckStateRole)
-                    publish_item.setData(self.STATUS_INVALID, self.STATUS_ROLE)
-                    self._set_parent(publish_item)
-
-                    # get the thumbnail
-                    thumbnail_id = self._sg_data_retriever.request_thumbnail(
-                        publish["image"], publish["type"], publish["id"], "image"
+            if self._query_cache:
+                # the thumbnail URLs change every time they're queried, they're not taken into account to check if
+                # the results have changed
+                try:
+                    changed = self._query_cache.set(
+                        self._get_cache_key(query),
+                        self._preset_name,
+                        publishes,
+                        get_results_digest(publishes),
                     )
-                    self._pending_requests[thumbnail_id] = publish_item
+                except sqlite3.Error as e:
+                    self._disable_query_cache(e)
+                    changed = True
+                if not changed and query.key in self._query_results:
+                    # the cached results used to populate the model are still up-to-date, only their thumbnail
+                    # URLs need to be refreshed
+                    self._refresh_volatile_fields(query, publishes)
+                    self._emit_data_loaded_if_done()
+                    return
 
-            self.data_loaded.emit()
+            self._queue_query_results(query, publishes)
 
-        elif request_type == "check_thumbnail":
+        elif request_type in ["check_thumbnail", "download_thumbnail"]:
 
-            file_item = self._pending_requests.pop(uid)
             thumb_path = data.get("thumb_path")
+            if not thumb_path and request_type == "check_thumbnail":
+                # the thumbnail isn't cached yet, it is now being downloaded using the same request id
+                return
+
+            del self._pending_requests[uid]
+            file_item = request
+            self._thumbnail_requests.pop(file_item, None)
             if thumb_path:
-                file_item.setIcon(QtGui.QPixmap(thumb_path))
-                file_item.emitDataChanged()
+                file_item.icon = QtGui.QIcon(QtGui.QPixmap(thumb_path))
+                self._emit_item_changed(file_item)
 
         else:
             del self._pending_requests[uid]
@@ -321,25 +929,619 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
         :param uid:         The unique id representing the task that the data retriever failed on
         :param error_msg:   The error message for the failed task
         """
-        if uid in self._pending_requests:
-            del self._pending_requests[uid]
+        if uid in self._prefetch_requests:
+            # give up prefetching the preset, it will be loaded when selected
+            preset_name, _ = self._prefetch_requests[uid]
+            self._cancel_prefetch(preset_name)
+            self._prefetch_next_preset()
+            return
+
+        generation, request = self._pending_requests.pop(uid, (None, None))
+        if isinstance(request, FileModel.FileItem):
+            self._thumbnail_requests.pop(request, None)
         self._bundle.logger.debug(
             "File Model: Failed to find sg_data for id %s: %s" % (uid, error_msg)
         )
+        # the thumbnails aren't part of the data loading, only a failed query of the current load can complete it
+        if isinstance(request, tuple) and generation == self._generation:
+            self._emit_data_loaded_if_done()
+
+    def _store_current_preset(self):
+        """Keep the data of the current preset in memory, if it has been fully loaded"""
+
+        if not self._preset_cache_size or not self._preset_name or not self._queries:
+            return
+        if self._ingestion_jobs or any(
+            isinstance(r, tuple) for _, r in self._pending_requests.values()
+        ):
+            return
+
+        preset_data = FileModel.PresetData(
+            self._queries, self._query_results, self._last_sync
+        )
+        preset_data.groups = self._groups
+        preset_data.query_items = self._query_items
+        preset_data.publish_items = self._publish_items
+        preset_data.orphan_items = self._orphan_items
+        preset_data.search_index = self._search_index
+        preset_data.scene_index = self._scene_index
+        preset_data.scene_version = self._scene_index.version
+        self._add_to_preset_cache(self._preset_name, preset_data)
+
+    def _add_to_preset_cache(self, preset_name, preset_data):
+        """Add the data of a preset to the in-memory cache, evicting the least recently used presets if needed"""
+
+        self._preset_cache.pop(preset_name, None)
+        self._preset_cache[preset_name] = preset_data
+        while len(self._preset_cache) > self._preset_cache_size:
+            self._preset_cache.popitem(last=False)
+
+    def _restore_preset(self, preset_data):
+        """
+        Populate the model with the data of a preset kept in memory. If the preset has already been displayed, its
+        items are swapped in as they are, so their check state is preserved. The preset queries are then executed
+        again in the background to only retrieve the published files updated in the meantime.
+        """
+
+        self._queries = preset_data.queries
+        self._query_results = preset_data.query_results
+        self._last_sync = preset_data.last_sync
+
+        self._scan_scene()
+
+        if preset_data.groups is not None:
+            self.beginResetModel()
+            self._groups = preset_data.groups
+            self._parent_items = dict((g.status, g) for g in self._groups)
+            self._query_items = preset_data.query_items
+            self._publish_items = preset_data.publish_items
+            self._orphan_items = preset_data.orphan_items
+            self._search_index = preset_data.search_index
+            self.endResetModel()
+
+            # the status of the items needs to be updated if the scene has changed since they were displayed
+            if (
+                preset_data.scene_index is not self._scene_index
+                or preset_data.scene_version != self._scene_index.version
+            ):
+                for query in self._queries:
+                    self._queue_query_results(query, self._query_results[query.key])
+        else:
+            for query in self._queries:
+                self._queue_query_results(query, self._query_results[query.key])
+
+        self._refresh_queries()
+        self._emit_data_loaded_if_done()
+
+    def _prefetch_next_preset(self):
+        """Prefetch the next preset which isn't in memory yet, one preset at a time so the current one isn't delayed"""
+
+        if self._prefetch_results or not self._preset_cache_size:
+            return
+
+        # don't prefetch more presets than the ones we can keep in memory
+        if len(self._preset_cache) >= self._preset_cache_size - 1:
+            return
+
+        for preset in self._bundle.get_setting("presets"):
+            preset_name = preset["name"]
+            if (
+                preset_name == self._preset_name
+                or preset_name in self._preset_cache
+                or preset_name in self._prefetched_presets
+            ):
+                continue
+
+            self._prefetched_presets.add(preset_name)
+            queries = self._compiler.compile(
+                self._bundle.shotgun, preset, self._bundle.context
+            )
+            self._prefetch_results[preset_name] = [queries, {}]
+            for query in queries:
+                if self._bundle.get_setting("latest_versions_only"):
+                    uid = self._sg_data_retriever.execute_method(
+                        find_latest_publishes, query, self._scene_index.publish_ids
+                    )
+                else:
+                    uid = self._sg_data_retriever.execute_find(
+                        "PublishedFile", query.filters, query.fields, query.order
+                    )
+                self._prefetch_requests[uid] = (preset_name, query)
+            return
+
+    def _on_prefetch_completed(self, uid, publishes):
+        """Store the results of a prefetch query, and keep the preset in memory once all its queries are done"""
+
+        preset_name, query = self._prefetch_requests.pop(uid)
+        queries, query_results = self._prefetch_results[preset_name]
+        query_results[query.key] = publishes
+        if len(query_results) < len(queries):
+            return
+
+        del self._prefetch_results[preset_name]
+        last_sync = {}
+        for query in queries:
+            timestamps = [
+                p["updated_at"] for p in query_results[query.key] if p.get("updated_at")
+            ]
+            if timestamps:
+                last_sync[query.key] = max(timestamps)
+        self._add_to_preset_cache(
+            preset_name, FileModel.PresetData(queries, query_results, last_sync)
+        )
+
+        self._prefetch_next_preset()
+
+    def _cancel_prefetch(self, preset_name=None):
+        """
+        Cancel the prefetch of a preset.
+
+        :param preset_name: Name of the preset to cancel the prefetch for. If None, all the prefetches are cancelled.
+        """
+        for uid, (name, _) in list(self._prefetch_requests.items()):
+            if preset_name is None or name == preset_name:
+                del self._prefetch_requests[uid]
+                if self._sg_data_retriever:
+                    self._sg_data_retriever.stop_work(uid)
+        if preset_name is None:
+            self._prefetch_results = {}
+        else:
+            self._prefetch_results.pop(preset_name, None)
+
+    def _add_pending_request(self, uid, request):
+        """Keep track of a request sent to the data retriever, along with the generation it belongs to"""
+        self._pending_requests[uid] = (self._generation, request)
+
+    def _add_query_request(self, uid, query, refresh):
+        """
+        Keep track of a preset query sent to the data retriever.
+
+        :param uid:     The unique id of the request
+        :param query:   The :class:`PresetQuery` being executed
+        :param refresh: True if the query only retrieves the published files updated since the last sync
+        """
+        self._add_pending_request(uid, (query, refresh))
+        if self._metrics.enabled:
+            self._query_start_times[uid] = time.perf_counter()
+
+    def _disable_query_cache(self, error):
+        """Stop using the query cache after a database error, for example if it's locked or corrupted"""
+        self._bundle.logger.warning(
+            "File Model: Disabling query cache %s: %s" % (self._query_cache.path, error)
+        )
+        self._query_cache.close()
+        self._query_cache = None
+
+    @staticmethod
+    def _get_query_results(request_type, data):
+        """
+        Get the published files returned by a query run by the data retriever: the queries run with
+        :func:`find_latest_publishes` are executed as methods, whose result isn't stored under the same key.
+        """
+        if request_type == "method":
+            return data["return_value"]
+        return data["sg"]
+
+    def _refresh_volatile_fields(self, query, sg_publishes):
+        """
+        Replace the PTR data of the items of a query by the latest query results when only their volatile fields,
+        like the thumbnail URLs, have changed. The views don't need to be notified.
+
+        :param query:        The :class:`PresetQuery` which has been executed
+        :param sg_publishes: List of published files returned by the query
+        """
+
+        self._query_results[query.key] = sg_publishes
+        publishes_by_id = dict((p["id"], p) for p in sg_publishes)
+        for item in self._query_items.get(query.key, {}).values():
+            for action_index in query.action_indexes:
+                claim = item.claims.get(action_index)
+                if claim and claim[1]["id"] in publishes_by_id:
+                    item.claims[action_index] = (
+                        claim[0],
+                        publishes_by_id[claim[1]["id"]],
+                    )
+            publish = publishes_by_id.get(item.sg_data["id"])
+            if publish is not None:
+                item.sg_data = publish
+
+    def _get_cache_key(self, query):
+        """Get the key used to store the results of a query in the cache"""
+        return get_cache_key(
+            self._preset_name,
+            query.key,
+            self._bundle.get_setting("latest_versions_only"),
+        )
+
+    def _queue_query_results(self, query, sg_publishes):
+        """
+        Queue the results of a preset query to be processed in chunks, in between the processing of the UI events.
+
+        :param query:        The :class:`PresetQuery` which has been executed
+        :param sg_publishes: List of published files returned by the query
+        """
+
+        self._query_results[query.key] = sg_publishes
+
+        # keep track of the last update we know about to be able to only query the changes when refreshing
+        timestamps = [p["updated_at"] for p in sg_publishes if p.get("updated_at")]
+        if timestamps:
+            self._last_sync[query.key] = max(timestamps)
+
+        self._ingestion_jobs.append(self._process_query_results(query, sg_publishes))
+        if not self._ingestion_timer.isActive():
+            self._ingestion_timer.start()
+
+    def _process_ingestion_jobs(self):
+        """
+        Process the queued query results until the time budget is exhausted, and insert the new items in the model.
+        The processing will be resumed on the next event loop iteration.
+        """
+
+        start_time = time.perf_counter()
+        deadline = start_time + self._ingestion_budget
+        while self._ingestion_jobs and time.perf_counter() < deadline:
+            try:
+                next(self._ingestion_jobs[0])
+            except StopIteration:
+                self._ingestion_jobs.pop(0)
+
+        self._insert_items()
+        self._grouping_time += time.perf_counter() - start_time
+
+        if not self._ingestion_jobs:
+            self._ingestion_timer.stop()
+            self._emit_data_loaded_if_done()
+
+    def _emit_data_loaded_if_done(self):
+        """Emit the data_loaded signal if all the queries have completed and their results have been processed"""
+
+        if self._ingestion_jobs:
+            return
+        if any(isinstance(r, tuple) for _, r in self._pending_requests.values()):
+            return
+
+        if self._load_start_time is not None:
+            if self._metrics.enabled:
+                rows_kept = sum(len(g.items) for g in self._groups)
+                self._metrics.record(
+                    "grouping", self._grouping_time, rows_kept=rows_kept
+                )
+                self._metrics.record(
+                    "load",
+                    time.perf_counter() - self._load_start_time,
+                    rows_kept=rows_kept,
+                    thumbnails_requested=self._thumbnail_request_count,
+                )
+            self._load_start_time = None
+
+        self.data_loaded.emit()
+
+        # now that the current preset is loaded, we can prefetch the other ones
+        self._prefetch_next_preset()
+
+    def _process_query_results(self, query, sg_publishes):
+        """
+        Create or update the model items according to the results of a preset query. This is a generator yielding
+        after each processed published file, so the work can be split in chunks.
+
+        If the query has already been processed (for example from the cache), the existing items are updated in place
+        so their check state is preserved, the items which aren't part of the results anymore are removed and the
+        new ones are added.
+
+        The published files are identified across all the actions and queries of the preset, so a file matched by
+        several actions only gets a single item, using the loader action and the published file version of the first
+        of these actions.
+
+        :param query:        The :class:`PresetQuery` which has been executed
+        :param sg_publishes: List of published files returned by the query
+        """
+
+        old_items = self._query_items.get(query.key, {})
+        new_items = {}
+        new_claims = set()
+
+        for action_index, (action_mappings, publishes) in zip(
+            query.action_indexes, query.demultiplex(sg_publishes)
+        ):
+
+            # first, go through each published files to check if they have already been loaded to the scene
+            # NOTE this routine depends on the published files sorted in descending order of version number,
+            # e.g. latest version first, so that we can create the FileItem with the first published file
+            # that is encountered
+            action_keys = set()
+            for publish in publishes:
+
+                # make sure we're only keeping the latest version of each file and not the whole history
+                publish_key = get_publish_key(publish)
+                if publish_key in action_keys:
+                    # We already have a publish item, make sure its status is correctly set
+                    self._update_status(self._publish_items[publish_key], publish)
+                    yield
+                    continue
+                action_keys.add(publish_key)
+                new_claims.add((publish_key, action_index))
+
+                # the published files are identified across all the actions of the preset, so a file matched by
+                # several actions only gets a single item
+                publish_item = self._publish_items.get(publish_key)
+                if not publish_item:
+                    # No publish item exists, create the FileItem with the latest version of the published file
+                    publish_item = self._create_file_item(publish)
+                    self._publish_items[publish_key] = publish_item
+                    self._items_to_insert.append(publish_item)
+                # the item is updated with the latest version of the published file, unless an action coming first
+                # in the preset claims another version of it
+                self._set_claim(
+                    publish_item,
+                    action_index,
+                    action_mappings.get(publish["published_file_type"]["name"]),
+                    publish,
+                )
+                new_items[publish_key] = publish_item
+                yield
+
+        # the actions of this query which don't match a published file anymore release their claim on its item, and
+        # the items which aren't claimed by any action are removed
+        action_indexes = set(query.action_indexes)
+        for publish_key, publish_item in list(old_items.items()) + list(
+            new_items.items()
+        ):
+            stale_claims = [
+                i
+                for i in publish_item.claims
+                if i in action_indexes and (publish_key, i) not in new_claims
+            ]
+            if not stale_claims:
+                continue
+            for action_index in stale_claims:
+                del publish_item.claims[action_index]
+            if publish_item.claims:
+                self._set_claim(publish_item)
+            else:
+                if self._publish_items.get(publish_key) is publish_item:
+                    del self._publish_items[publish_key]
+                self._remove_item(publish_item)
+
+        self._query_items[query.key] = new_items
+
+        # now, we need to take care of the object already loaded to the scene that is not associated to it anymore
+        # the scene element doesn't have an associated publish file, we need to flag it to be removed
+        orphan_items = {}
+        for obj in self._scene_index.get_orphans(set(self._publish_items)):
+            publish_item = self._orphan_items.pop(obj.sg_data["id"], None)
+            if not publish_item:
+                publish_item = self._create_file_item(obj.sg_data)
+                self._update_status(publish_item, status=self.STATUS_INVALID)
+                self._items_to_insert.append(publish_item)
+            orphan_items[obj.sg_data["id"]] = publish_item
+            yield
+
+        for publish_item in self._orphan_items.values():
+            self._remove_item(publish_item)
+        self._orphan_items = orphan_items
+
+    def _set_claim(self, item, action_index=None, action_name=None, sg_data=None):
+        """
+        Register the action matching the published file of an item, and use the loader action and the published file
+        version of the first action of the preset claiming the item, so the result doesn't depend on the order the
+        queries complete in.
+
+        :param item:         The :class:`FileModel.FileItem`
+        :param action_index: Position of the action in the preset. If None, the item is only updated according to
+                             its remaining claims.
+        :param action_name:  Name of the loader action to use for the item according to the action
+        :param sg_data:      Published file matched by the action
+        """
+
+        if action_index is not None:
+            item.claims[action_index] = (action_name, sg_data)
+        claim_index = min(item.claims)
+        if action_index is not None and action_index > claim_index:
+            # an action coming first in the preset has already claimed the item
+            return
+
+        action_name, sg_data = item.claims[claim_index]
+        self._update_item_data(item, sg_data)
+        self._update_status(item, sg_data)
+        if item.action_name != action_name:
+            item.action_name = action_name
+            self._emit_item_changed(item)
+
+    def _insert_items(self):
+        """
+        Move the items whose status has changed to their new group in a single layout change, then insert the newly
+        created items in the model, in one batch per status group
+        """
+
+        self._move_items(self._items_to_move)
+        self._items_to_move = []
+
+        items_by_status = {}
+        for item in self._items_to_insert:
+            items_by_status.setdefault(item.status, []).append(item)
+        self._items_to_insert = []
+
+        for status, items in items_by_status.items():
+            if status is not None:
+                self._append_items(status, items)
+
+    def _append_items(self, status, items):
+        """Append some items to the group matching the given status, creating the group if needed"""
+
+        group = self._parent_items.get(status)
+        if not group:
+            # keep the groups sorted by status, so they don't move around when they're removed and added back
+            group = FileModel.GroupItem(status)
+            group.row = len([g for g in self._groups if g.status < status])
+            self.beginInsertRows(QtCore.QModelIndex(), group.row, group.row)
+            self._groups.insert(group.row, group)
+            self._parent_items[status] = group
+            for row in range(group.row + 1, len(self._groups)):
+                self._groups[row].row = row
+            self.endInsertRows()
+
+        first_row = len(group.items)
+        self.beginInsertRows(
+            self.index_from_item(group), first_row, first_row + len(items) - 1
+        )
+        for row, item in enumerate(items, first_row):
+            item.group = group
+            item.row = row
+        group.items.extend(items)
+        self.endInsertRows()
+
+    def _take_item(self, item):
+        """Remove an item from its group without deleting it, as well as the group if it becomes empty"""
+
+        group = item.group
+        if not group:
+            return
+
+        self.beginRemoveRows(self.index_from_item(group), item.row, item.row)
+        del group.items[item.row]
+        for row in range(item.row, len(group.items)):
+            group.items[row].row = row
+        item.group = None
+        item.row = None
+        self.endRemoveRows()
+
+        # if the group doesn't have children anymore, remove it
+        if not group.items:
+            self.beginRemoveRows(QtCore.QModelIndex(), group.row, group.row)
+            del self._groups[group.row]
+            del self._parent_items[group.status]
+            for row in range(group.row, len(self._groups)):
+                self._groups[row].row = row
+            self.endRemoveRows()
+
+    def _update_item_data(self, item, sg_data):
+        """Update the PTR data of an item, refreshing its text and thumbnail if they may have changed"""
+
+        if item.sg_data == sg_data:
+            return
+        changed = get_stable_data(item.sg_data) != get_stable_data(sg_data)
+        item.sg_data = sg_data
+        if not changed:
+            # only the thumbnail URL has changed, the thumbnail already loaded is still valid
+            return
+
+        self._search_index.update(item)
+        # the thumbnail is loaded again if the item is visible
+        needs_thumbnail = item.icon is not None
+        self._cancel_thumbnail_request(item)
+        item.icon = None
+        if needs_thumbnail:
+            self._request_thumbnail(item)
+        self._emit_item_changed(item)
+
+    def _emit_item_changed(self, item):
+        """Notify the views that the data of an item has changed"""
+
+        index = self.index_from_item(item)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+    def _create_file_item(self, sg_data, action_name=None):
+        """Create a new FileItem for the given published file"""
+
+        publish_item = FileModel.FileItem(sg_data)
+        publish_item.action_name = action_name
+        self._search_index.add(publish_item)
+        return publish_item
+
+    def request_thumbnails(self, items):
+        """
+        Request the thumbnails of the given items, for example the ones visible in a view. The thumbnail requests of
+        the items which aren't part of the list anymore are cancelled, so they don't delay the visible ones.
+
+        :param items: List of :class:`FileModel.FileItem`, sorted by priority
+        """
+
+        wanted_items = set(items)
+        for item in list(self._thumbnail_requests.keys()):
+            if item not in wanted_items:
+                self._cancel_thumbnail_request(item)
+
+        # the requests are processed in order, so the first items of the list will be loaded first
+        for item in items:
+            self._request_thumbnail(item)
+
+    def _request_thumbnail(self, item):
+        """Request the thumbnail of an item, if it isn't loaded or requested yet, without cancelling other requests"""
+
+        if item.icon is not None or item in self._thumbnail_requests:
+            return
+        if not item.sg_data.get("image"):
+            return
+        thumbnail_id = self._sg_data_retriever.request_thumbnail(
+            item.sg_data["image"],
+            item.sg_data["type"],
+            item.sg_data["id"],
+            "image",
+        )
+        self._add_pending_request(thumbnail_id, item)
+        self._thumbnail_requests[item] = thumbnail_id
+        self._thumbnail_request_count += 1
+
+    def _cancel_thumbnail_request(self, item):
+        """Cancel the pending thumbnail request of an item, if any"""
+
+        thumbnail_id = self._thumbnail_requests.pop(item, None)
+        if thumbnail_id is None:
+            return
+        self._pending_requests.pop(thumbnail_id, None)
+        self._sg_data_retriever.stop_work(thumbnail_id)
+
+    def _remove_item(self, item):
+        """Remove a FileItem from the model, as well as its parent group if it becomes empty"""
+
+        # make sure we won't try to update the item once its thumbnail is downloaded
+        self._cancel_thumbnail_request(item)
+        self._search_index.remove(item)
+        self._take_item(item)
+        # the item may not have been inserted yet, make sure it won't be
+        item.status = None
 
     def set_status(self, item, sg_data=None, status=None):
         """Set the item status"""
 
+        if self._update_status(item, sg_data, status):
+            self._move_items(self._items_to_move)
+            self._items_to_move = []
+
+    def set_statuses(self, items, status):
+        """
+        Set the status of several items at once. The items whose status changes are moved to their new group in a
+        single layout change, rather than one row removal and insertion per item.
+
+        :param items:  List of :class:`FileModel.FileItem`
+        :param status: The status to set
+        """
+
+        for item in items:
+            self._update_status(item, status=status)
+        self._move_items(self._items_to_move)
+        self._items_to_move = []
+
+    def _update_status(self, item, sg_data=None, status=None):
+        """
+        Set the item status. If the item needs to be moved to another group, it is queued to be moved with the other
+        items in a single batch.
+
+        :returns: True if the item has been queued to be moved
+        """
+
         # Get the current item status
-        item_status = item.data(self.STATUS_ROLE)
+        item_status = item.status
 
         # If no status is explicitly given, set the status of the item based on the given sg data
         if not status and sg_data:
             # Check if the new sg data is already loaded in the scene
-            already_loaded, scene_obj = self._is_publish_already_loaded(sg_data["id"])
-            file_item_sg_data = item.data(self.SG_DATA_ROLE)
+            scene_obj = self._scene_index.get(sg_data["id"])
+            already_loaded = scene_obj is not None
 
-            if file_item_sg_data["id"] == sg_data["id"]:
+            if item.sg_data["id"] == sg_data["id"]:
                 # The sg data matches the current item data, set the status based on if it is
                 # already loaded or not
                 status = (
@@ -348,50 +1550,72 @@ class FileModel(QtGui.QStandardItemModel, ViewItemRolesMixin):
             elif already_loaded:
                 # The file that was loaded for this item is now out of date
                 status = self.STATUS_OUTDATED
-                item.setData(scene_obj, self.BREAKDOWN_DATA_ROLE)
+                item.scene_obj = scene_obj
             else:
-                return  # Nothing to do
+                return False  # Nothing to do
 
-        item.setData(status, self.STATUS_ROLE)
+        item.status = status
+        self._search_index.update_status(item)
 
-        # if the status has changed and the item is already parented, we need to update the parent as it won't
+        # if the status has changed and the item is already parented, we need to move it to its new group
         if item_status != status and item.parent():
-            self._set_parent(item)
+            self._items_to_move.append(item)
+            return True
+        return False
 
-    def _set_parent(self, item):
-        """Set the item parent"""
+    def _move_items(self, items):
+        """
+        Move the items to the groups matching their status. A single item is moved using row removal and insertion,
+        while several items are regrouped at once within a single layout change.
+        """
 
-        status = item.data(self.STATUS_ROLE)
-        if status is None:
+        # an item can be queued several times, for example as not loaded for its new latest version and then as out
+        # of date because an older version is loaded in the scene: it's only moved once, to its final group
+        items = [
+            i for i in dict.fromkeys(items) if i.group and i.group.status != i.status
+        ]
+        if len(items) == 1:
+            self._take_item(items[0])
+            self._append_items(items[0].status, items)
+            return
+        elif not items:
             return
 
-        # the item is already parented to another item, we want to remove it from its parent without deleting the item
-        if item.parent():
-
-            row = item.row()
-            parent_item = item.parent()
-            parent_status = parent_item.data(self.STATUS_ROLE)
-
-            if parent_status == status:
-                return
-            parent_item.takeChild(row)
-            parent_item.removeRow(row)
-
-            # if the parent doesn't have children anymore, remove it
-            if not parent_item.hasChildren():
-                self.removeRow(parent_item.row())
-                del self._parent_items[parent_status]
-
-        parent_item = self._parent_items.get(status)
-        if not parent_item:
-            parent_item = FileModel.GroupItem(status)
-            self.invisibleRootItem().appendRow(parent_item)
-            self._parent_items[status] = parent_item
-        parent_item.appendRow(item)
-
-    def _is_publish_already_loaded(self, publish_id):
-        """Check if the published file is already loaded into the current scene"""
-        for obj in self._scene_objs:
-            if obj.sg_data["id"] == publish_id:
-                return True, obj
-        return False, None
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_records = [self.item_from_index(index) for index in old_indexes]
+
+        # take the items out of their group, keeping the order of the remaining ones, and append them to their new one
+        moved_items = set(items)
+        changed_groups = set(item.group for item in items)
+        for group in changed_groups:
+            group.items = [i for i in group.items if i not in moved_items]
+        for item in items:
+            group = self._parent_items.get(item.status)
+            if not group:
+                group = FileModel.GroupItem(item.status)
+                self._parent_items[item.status] = group
+            group.items.append(item)
+            item.group = group
+            changed_groups.add(group)
+
+        # remove the empty groups, keeping the other ones sorted by status
+        for group in list(self._parent_items.values()):
+            if not group.items:
+                del self._parent_items[group.status]
+                group.row = None
+        self._groups = sorted(self._parent_items.values(), key=lambda g: g.status)
+        for row, group in enumerate(self._groups):
+            group.row = row
+        for group in changed_groups:
+            for row, item in enumerate(group.items):
+                item.row = row
+
+        self.changePersistentIndexList(
+            old_indexes,
+            [
+                self.index_from_item(record) if record else QtCore.QModelIndex()
+                for record in old_records
+            ],
+        )
+        self.layoutChanged.emit()
@@ -0,0 +1,582 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from .cache import get_cache_key
+from .utils import resolve_filters
+
+# operators we know how to evaluate on the client side to dispatch the results of a merged query back to the
+# actions they belong to
+SUPPORTED_OPERATORS = [
+    "is",
+    "is_not",
+    "in",
+    "not_in",
+    "contains",
+    "not_contains",
+    "starts_with",
+    "ends_with",
+    "less_than",
+    "greater_than",
+    "type_is",
+    "type_is_not",
+    "name_is",
+    "name_contains",
+    "name_not_contains",
+]
+
+# operators comparing the field value to the filter value. They are only evaluated on the client side when the filter
+# value is a number: dates can be given as strings or as datetimes, with or without a timezone, which can't be compared
+# reliably to the values returned by PTR.
+COMPARISON_OPERATORS = ["less_than", "greater_than"]
+
+PUBLISHED_FILE_TYPE_FIELD = "published_file_type"
+
+# fields identifying a published file across its versions
+PUBLISH_GROUPING_FIELDS = ["task", "published_file_type", "name"]
+
+# fields needed to display the published files and compute their status. The full set of fields needed by the loader
+# actions is only fetched at build time, for the files which are actually loaded or updated.
+PUBLISH_LIST_FIELDS = [
+    "id",
+    "type",
+    "entity",
+    "name",
+    "published_file_type",
+    "version_number",
+    "task",
+    "image",
+    "updated_at",
+]
+
+# maximum number of (task, type, name, version) groups to fetch in a single query when only retrieving the latest
+# versions of the published files
+LATEST_VERSIONS_BATCH_SIZE = 200
+
+
+class PresetQuery(object):
+    """
+    A single PTR query covering one or several actions of a preset.
+
+    When several actions are folded into the same query, the results are dispatched back to each action on the
+    client side by evaluating the action filters against the returned published files.
+    """
+
+    def __init__(self, fields, order):
+        """
+        Class constructor.
+
+        :param fields: List of PTR fields to query
+        :param order:  PTR order to use when querying the published files
+        """
+        self.fields = list(fields)
+        self.order = order
+        self._actions = []
+        self._action_indexes = []
+
+    @property
+    def actions(self):
+        """List of (filters, action_mappings) tuples covered by this query."""
+        return self._actions
+
+    @property
+    def action_indexes(self):
+        """
+        List of the positions of the actions covered by this query in their preset, in the same order as
+        :attr:`actions`. The first actions of a preset take precedence when several actions match the same
+        published file.
+        """
+        return self._action_indexes
+
+    @property
+    def key(self):
+        """Key identifying the query, computed from its filters, fields and order."""
+        return get_cache_key(self.filters, self.fields, self.order)
+
+    @property
+    def filters(self):
+        """PTR filters to use to run the query."""
+        if len(self._actions) == 1:
+            return self._actions[0][0]
+        return [
+            {
+                "filter_operator": "any",
+                "filters": [
+                    {"filter_operator": "all", "filters": filters}
+                    for filters, _ in self._actions
+                ],
+            }
+        ]
+
+    def add_action(self, filters, action_mappings, action_index=None):
+        """
+        Add an action to the query.
+
+        :param filters:         Resolved PTR filters of the action
+        :param action_mappings: Mappings between the Published File Type and the action name
+        :param action_index:    Position of the action in its preset. If None, the action is considered to come
+                                after the ones already added to the query.
+        """
+        if action_index is None:
+            action_index = len(self._actions)
+        self._actions.append((filters, action_mappings))
+        self._action_indexes.append(action_index)
+        for field in get_filter_fields(filters):
+            if field not in self.fields:
+                self.fields.append(field)
+
+    def demultiplex(self, publishes):
+        """
+        Dispatch the query results back to the actions they belong to.
+
+        :param publishes: List of published files returned by the query
+        :returns: A list of (action_mappings, publishes) tuples, one per action. The order of the published files
+            returned by the query is preserved.
+        """
+        if len(self._actions) == 1:
+            return [(self._actions[0][1], publishes)]
+
+        return [
+            (
+                action_mappings,
+                [p for p in publishes if match_filters(p, filters)],
+            )
+            for filters, action_mappings in self._actions
+        ]
+
+
+def find_latest_publishes(sg, query, loaded_publish_ids=None):
+    """
+    Run a preset query, only retrieving the latest version of each published file instead of its whole history.
+
+    The latest version number of each (task, type, name) group is computed server-side using a summary query, and
+    the matching published files are then fetched in batches. The versions currently loaded in the scene are also
+    fetched, so that out-of-date files can still be detected.
+
+    When several actions are folded into the query, the latest versions are computed for each action: the latest
+    version matching all the actions together may not match the filters of a more restrictive action.
+
+    This method is meant to be run in a background thread using
+    :meth:`ShotgunDataRetriever.execute_method`.
+
+    :param sg:                 Shotgun API handle
+    :param query:              The :class:`PresetQuery` to run
+    :param loaded_publish_ids: List of ids of the published files loaded in the scene
+    :returns: A list of published files, sorted in descending order of version number
+    """
+
+    publishes = {}
+    for action_filters, _ in query.actions:
+        latest_filters = _get_latest_version_filters(sg, action_filters)
+        for i in range(0, len(latest_filters), LATEST_VERSIONS_BATCH_SIZE):
+            filters = action_filters + [
+                {
+                    "filter_operator": "any",
+                    "filters": latest_filters[i : i + LATEST_VERSIONS_BATCH_SIZE],
+                }
+            ]
+            for publish in sg.find("PublishedFile", filters, query.fields):
+                publishes[publish["id"]] = publish
+
+    # we also need the published files loaded in the scene to be able to flag the out-of-date ones
+    loaded_publish_ids = [i for i in loaded_publish_ids or [] if i not in publishes]
+    if loaded_publish_ids:
+        filters = query.filters + [["id", "in", loaded_publish_ids]]
+        for publish in sg.find("PublishedFile", filters, query.fields):
+            publishes[publish["id"]] = publish
+
+    return sorted(
+        publishes.values(),
+        key=lambda p: p.get("version_number") or 0,
+        reverse=True,
+    )
+
+
+def _get_latest_version_filters(sg, filters):
+    """
+    Get the filters matching the latest version of each (task, type, name) group of the published files matching
+    the given filters.
+    """
+
+    summary = sg.summarize(
+        "PublishedFile",
+        filters,
+        summary_fields=[{"field": "version_number", "type": "maximum"}],
+        grouping=[
+            {"field": field, "type": "exact", "direction": "asc"}
+            for field in PUBLISH_GROUPING_FIELDS
+        ],
+    )
+
+    # flatten the nested summary groups to get the latest version of each published file
+    latest_filters = []
+    for task_group in summary.get("groups", []):
+        for type_group in task_group.get("groups", []):
+            for name_group in type_group.get("groups", []):
+                latest_filters.append(
+                    {
+                        "filter_operator": "all",
+                        "filters": [
+                            ["task", "is", task_group["group_value"]],
+                            ["published_file_type", "is", type_group["group_value"]],
+                            ["name", "is", name_group["group_value"]],
+                            [
+                                "version_number",
+                                "is",
+                                name_group["summaries"]["version_number"],
+                            ],
+                        ],
+                    }
+                )
+    return latest_filters
+
+
+def summarize_query(sg, query):
+    """
+    Get a cheap summary of the results of a query, which changes whenever a published file matching the query is
+    created, updated or deleted: the number of published files and the last time one of them has been updated.
+
+    :param sg:    Shotgun API handle
+    :param query: The :class:`PresetQuery` to summarize
+    :returns: A dictionary of summaries
+    """
+    return sg.summarize(
+        "PublishedFile",
+        query.filters,
+        [
+            {"field": "id", "type": "count"},
+            {"field": "updated_at", "type": "maximum"},
+        ],
+    )["summaries"]
+
+
+def plan_preset_queries(actions, fields, order, context=None, publish_type_ids=None):
+    """
+    Build the list of queries needed to retrieve the published files of all the actions of a preset.
+
+    All the actions are folded into a single query using a `filter_operator: any` clause. Actions which can't be
+    demultiplexed on the client side (because they use filter operators we don't know how to evaluate) get their
+    own query.
+
+    :param actions: List of preset actions, as defined in the app settings
+    :param fields:  List of PTR fields to query
+    :param order:   PTR order to use when querying the published files
+    :param context: The context used to resolve the action filters. If None, the current context is used.
+    :param publish_type_ids: Optional dictionary of PublishedFileType id lists keyed by code, as several types may
+                             share the same code. When all the published file types of an action are found in it,
+                             the action filters on the type ids rather than following the type code deep-link, which
+                             is slower to evaluate server-side.
+    :returns: A list of :class:`PresetQuery`
+    """
+
+    merged_query = None
+    queries = []
+
+    for action_index, action in enumerate(actions):
+        publish_type_codes = list(action["action_mappings"].keys())
+        if publish_type_ids and all(c in publish_type_ids for c in publish_type_codes):
+            publish_type_filters = [
+                PUBLISHED_FILE_TYPE_FIELD,
+                "in",
+                [
+                    {"type": "PublishedFileType", "id": publish_type_id}
+                    for c in publish_type_codes
+                    for publish_type_id in publish_type_ids[c]
+                ],
+            ]
+        else:
+            publish_type_filters = [
+                "published_file_type.PublishedFileType.code",
+                "in",
+                publish_type_codes,
+            ]
+        filters = resolve_filters(action["context"], context) + [publish_type_filters]
+
+        if is_filter_supported(filters):
+            if not merged_query:
+                merged_query = PresetQuery(fields, order)
+                queries.append(merged_query)
+            query = merged_query
+        else:
+            query = PresetQuery(fields, order)
+            queries.append(query)
+        query.add_action(filters, action["action_mappings"], action_index)
+
+    return queries
+
+
+class PresetCompiler(object):
+    """
+    Compile the presets into query plans, and cache them so the preset filters are only resolved again when the
+    context or the preset definition changes.
+
+    The published file types used by the presets are resolved to their ids using a single PTR query, whose result is
+    cached for the lifetime of the compiler. If this query fails, the presets filter on the type codes instead.
+    """
+
+    def __init__(self, presets, fields, order, logger=None):
+        """
+        Class constructor.
+
+        :param presets: List of presets, as defined in the app settings. The published file types of all the presets
+                        are resolved at once.
+        :param fields:  List of PTR fields to query
+        :param order:   PTR order to use when querying the published files
+        :param logger:  Optional logger used to report the published file types which couldn't be resolved
+        """
+        self._logger = logger
+        self._fields = []
+        for field in fields:
+            if field not in self._fields:
+                self._fields.append(field)
+        self._order = order
+        self._plans = {}
+        self._publish_type_ids = {}
+        self._unresolved_codes = set()
+        for preset in presets:
+            self._unresolved_codes.update(_get_publish_type_codes(preset))
+
+    @property
+    def fields(self):
+        """List of PTR fields queried by the compiled plans, without duplicates."""
+        return list(self._fields)
+
+    @property
+    def order(self):
+        """PTR order used by the compiled plans."""
+        return self._order
+
+    def compile(self, sg, preset, context):
+        """
+        Get the query plan of a preset, compiling it if it hasn't been compiled yet for this preset definition and
+        context.
+
+        The returned queries are shared between the calls and must not be modified.
+
+        :param sg:      Shotgun API handle, used to resolve the published file types
+        :param preset:  The preset, as defined in the app settings
+        :param context: The context used to resolve the preset filters
+        :returns: A tuple of :class:`PresetQuery`
+        """
+
+        key = (get_cache_key(preset), str(context))
+        plan = self._plans.get(key)
+        if plan is None:
+            codes = _get_publish_type_codes(preset)
+            plan = tuple(
+                plan_preset_queries(
+                    preset["actions"],
+                    self._fields,
+                    self._order,
+                    context,
+                    self._resolve_publish_types(sg, codes),
+                )
+            )
+            # plans falling back on the code filters because the types couldn't be resolved are compiled again next
+            # time, so they get the faster id filters once PTR answers
+            if not self._unresolved_codes.intersection(codes):
+                self._plans[key] = plan
+        return plan
+
+    def _resolve_publish_types(self, sg, codes):
+        """
+        Get the ids of the published file types, only querying PTR for the codes which haven't been resolved yet.
+
+        :returns: A dictionary of PublishedFileType id lists keyed by code. It doesn't contain the codes which don't
+                  exist in PTR nor the ones which couldn't be resolved.
+        """
+
+        self._unresolved_codes.update(
+            c for c in codes if c not in self._publish_type_ids
+        )
+        if self._unresolved_codes:
+            try:
+                publish_types = sg.find(
+                    "PublishedFileType",
+                    [["code", "in", sorted(self._unresolved_codes)]],
+                    ["code"],
+                )
+            except Exception as e:
+                # the compilation must not fail because of this optimization, the code filters return the same files
+                if self._logger:
+                    self._logger.warning(
+                        "Couldn't resolve the published file types %s: %s"
+                        % (", ".join(sorted(self._unresolved_codes)), e)
+                    )
+            else:
+                # several types may share the same code, the filters must match all of them
+                for publish_type in publish_types:
+                    self._publish_type_ids.setdefault(publish_type["code"], []).append(
+                        publish_type["id"]
+                    )
+                # the codes which don't exist in PTR are only looked up once, they keep using the code filter
+                for code in self._unresolved_codes:
+                    self._publish_type_ids.setdefault(code, None)
+                self._unresolved_codes = set()
+
+        return dict((c, i) for c, i in self._publish_type_ids.items() if i is not None)
+
+
+def _get_publish_type_codes(preset):
+    """Get the codes of all the published file types used by a preset"""
+    codes = set()
+    for action in preset["actions"]:
+        codes.update(action["action_mappings"].keys())
+    return codes
+
+
+def is_filter_supported(filters):
+    """
+    Check if a list of filters can be evaluated on the client side.
+
+    :param filters: List of PTR filters
+    :returns: True if all the filters can be evaluated by :func:`match_filters`, False otherwise
+    """
+    for f in filters:
+        if isinstance(f, dict):
+            if f.get("filter_operator") not in ["all", "and", "any", "or"]:
+                return False
+            if not is_filter_supported(f["filters"]):
+                return False
+        elif len(f) < 3 or f[1] not in SUPPORTED_OPERATORS:
+            return False
+        elif f[1] in COMPARISON_OPERATORS and not _is_number(f[2]):
+            return False
+    return True
+
+
+def get_filter_fields(filters):
+    """
+    Get the list of fields a list of filters depends on.
+
+    :param filters: List of PTR filters
+    :returns: A list of field names, in the order they've been found
+    """
+    fields = []
+    for f in filters:
+        if isinstance(f, dict):
+            sub_fields = get_filter_fields(f["filters"])
+        else:
+            sub_fields = [_get_record_field(f[0])]
+        for field in sub_fields:
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def match_filters(record, filters, filter_operator="all"):
+    """
+    Evaluate a list of PTR filters against a record returned by a query.
+
+    :param record:          Dictionary of PTR data
+    :param filters:         List of PTR filters. All the fields used by the filters must have been queried.
+    :param filter_operator: How to combine the filters, either "all" or "any"
+    :returns: True if the record matches the filters, False otherwise
+    """
+    check = any if filter_operator in ["any", "or"] else all
+    return check(
+        (
+            match_filters(record, f["filters"], f["filter_operator"])
+            if isinstance(f, dict)
+            else _match_filter(record, f)
+        )
+        for f in filters
+    )
+
+
+def _get_record_field(field):
+    """
+    Get the name of the record field a filter relies on.
+
+    Filtering on the published file type code is resolved using the published file type entity dictionary, which
+    holds the code as its name.
+    """
+    if field == "published_file_type.PublishedFileType.code":
+        return PUBLISHED_FILE_TYPE_FIELD
+    return field
+
+
+def _match_filter(record, f):
+    """Evaluate a single PTR filter against a record"""
+
+    field, operator = f[0], f[1]
+    values = f[2] if len(f) == 3 else list(f[2:])
+
+    record_field = _get_record_field(field)
+    value = record.get(record_field)
+    if record_field != field:
+        # the published file type code is stored as the entity name
+        value = value.get("name") if value else None
+
+    # multi-entity fields are returned as lists, the filter matches if any of the linked entities matches
+    if isinstance(value, list) and operator not in ["contains", "not_contains"]:
+        negative = operator in ["is_not", "not_in", "type_is_not", "name_not_contains"]
+        check = all if negative else any
+        return check(_match_value(v, operator, values) for v in value) or (
+            negative and not value
+        )
+
+    return _match_value(value, operator, values)
+
+
+def _match_value(value, operator, values):
+    """Evaluate a filter operator against a single value"""
+
+    if operator == "is":
+        return _normalize(value) == _normalize(values)
+    elif operator == "is_not":
+        return _normalize(value) != _normalize(values)
+    elif operator == "in":
+        return _normalize(value) in [_normalize(v) for v in _as_list(values)]
+    elif operator == "not_in":
+        return _normalize(value) not in [_normalize(v) for v in _as_list(values)]
+    elif operator in ["contains", "not_contains"]:
+        if isinstance(value, list):
+            found = _normalize(values) in [_normalize(v) for v in value]
+        else:
+            found = value is not None and str(values).lower() in str(value).lower()
+        return found if operator == "contains" else not found
+    elif operator == "starts_with":
+        return value is not None and str(value).lower().startswith(str(values).lower())
+    elif operator == "ends_with":
+        return value is not None and str(value).lower().endswith(str(values).lower())
+    elif operator == "less_than":
+        return value is not None and value < values
+    elif operator == "greater_than":
+        return value is not None and value > values
+    elif operator == "type_is":
+        return value is not None and value.get("type") == values
+    elif operator == "type_is_not":
+        return value is None or value.get("type") != values
+    elif operator in ["name_is", "name_contains", "name_not_contains"]:
+        name = (value or {}).get("name") or ""
+        if operator == "name_is":
+            return name.lower() == str(values).lower()
+        found = str(values).lower() in name.lower()
+        return found if operator == "name_contains" else not found
+    return False
+
+
+def _is_number(value):
+    """Check if a filter value is a number which can be compared to the values returned by PTR"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _as_list(values):
+    """Make sure we're dealing with a list of values"""
+    return values if isinstance(values, (list, tuple)) else [values]
+
+
+def _normalize(value):
+    """Normalize a value so it can be compared to the one stored in a filter"""
+    if isinstance(value, dict) and "type" in value and "id" in value:
+        return (value["type"], value["id"])
+    if isinstance(value, str):
+        return value.lower()
+    return value
@@ -0,0 +1,139 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+
+def get_publish_key(sg_data):
+    """
+    Get the key identifying a published file across all its versions.
+
+    :param sg_data: Dictionary of PTR data representing a published file
+    :returns: A (task id, published file type id, name) tuple
+    """
+    return (
+        (sg_data.get("task") or {}).get("id"),
+        (sg_data.get("published_file_type") or {}).get("id"),
+        sg_data.get("name"),
+    )
+
+
+class LoadedPublish(object):
+    """
+    Stand-in for the scene object of a published file which has just been loaded, until the scene is scanned again,
+    or of a published file referenced by a deserialized build plan.
+    """
+
+    __slots__ = ("sg_data",)
+
+    def __init__(self, sg_data):
+        """
+        Class constructor.
+
+        :param sg_data: Dictionary of PTR data representing the loaded published file
+        """
+        self.sg_data = sg_data
+
+
+class SceneIndex(object):
+    """
+    Index of the objects found when scanning the current scene, allowing constant time lookups by published file id
+    and by published file key.
+    """
+
+    def __init__(self, scene_objs=None):
+        """
+        Class constructor.
+
+        :param scene_objs: List of objects returned by the breakdown manager when scanning the scene
+        """
+        self._objs = {}
+        self._objs_by_id = {}
+        self._objs_by_key = {}
+        # incremented each time the index is modified
+        self.version = 0
+
+        for obj in scene_objs or []:
+            self.add(obj)
+
+    def __iter__(self):
+        """Iterate over all the scene objects"""
+        return iter(list(self._objs.values()))
+
+    def __len__(self):
+        """Number of objects in the scene"""
+        return len(self._objs)
+
+    @property
+    def publish_ids(self):
+        """List of the ids of all the published files loaded in the scene."""
+        return list(self._objs_by_id.keys())
+
+    def add(self, obj):
+        """
+        Add a scene object to the index.
+
+        :param obj: Scene object, as returned by the breakdown manager
+        """
+        self._objs[id(obj)] = obj
+        self.version += 1
+        self._objs_by_id.setdefault(obj.sg_data["id"], []).append(obj)
+        self._objs_by_key.setdefault(get_publish_key(obj.sg_data), []).append(obj)
+
+    def remove(self, obj):
+        """
+        Remove a scene object from the index. The object must be removed before its PTR data gets modified, for
+        example before updating it to its latest version.
+
+        :param obj: Scene object, as returned by the breakdown manager
+        """
+        if self._objs.pop(id(obj), None) is None:
+            return
+        self.version += 1
+        for index, key in [
+            (self._objs_by_id, obj.sg_data["id"]),
+            (self._objs_by_key, get_publish_key(obj.sg_data)),
+        ]:
+            objs = index.get(key, [])
+            if obj in objs:
+                objs.remove(obj)
+            if not objs:
+                index.pop(key, None)
+
+    def get(self, publish_id):
+        """
+        Get the scene object associated to a published file.
+
+        :param publish_id: Id of the published file
+        :returns: The first scene object found for this published file, None if the published file isn't loaded
+        """
+        objs = self._objs_by_id.get(publish_id)
+        return objs[0] if objs else None
+
+    def get_by_key(self, key):
+        """
+        Get all the scene objects associated to any version of a published file.
+
+        :param key: Key of the published file, as returned by :func:`get_publish_key`
+        :returns: A list of scene objects
+        """
+        return list(self._objs_by_key.get(key, []))
+
+    def get_orphans(self, keys):
+        """
+        Get the scene objects which aren't associated to any of the given published file keys.
+
+        :param keys: Set of published file keys, as returned by :func:`get_publish_key`
+        :returns: A list of scene objects
+        """
+        return [
+            obj
+            for key, objs in self._objs_by_key.items()
+            if key not in keys
+            for obj in objs
+        ]
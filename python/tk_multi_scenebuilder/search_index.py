@@ -0,0 +1,312 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import re
+
+# characters separating the words of the searchable fields
+WORD_SEPARATOR = re.compile(r"[^0-9a-z]+")
+
+
+def tokenize(text):
+    """
+    Split a text into lower case words.
+
+    :param text: The text to split
+    :returns: The list of words of the text
+    """
+    return [t for t in WORD_SEPARATOR.split(text.lower()) if t]
+
+
+def get_search_tokens(sg_data):
+    """
+    Get the words a published file can be found by: the words of its entity name, name and type, as well as its
+    version number, which are the fields displayed in the file list.
+
+    :param sg_data: Dictionary of PTR data representing the published file
+    :returns: A set of words
+    """
+
+    tokens = set()
+    for value in [
+        (sg_data.get("entity") or {}).get("name"),
+        sg_data.get("name"),
+        (sg_data.get("published_file_type") or {}).get("name"),
+    ]:
+        if value:
+            tokens.update(tokenize(str(value)))
+
+    version = sg_data.get("version_number")
+    if version is not None:
+        tokens.add(str(version))
+        tokens.add("v%s" % version)
+        tokens.add("v%03d" % version)
+    return tokens
+
+
+def get_trigrams(token):
+    """Get the set of the three character sequences of a word, empty if the word is shorter than three characters"""
+    return set(token[i : i + 3] for i in range(len(token) - 2))
+
+
+class SearchIndex(object):
+    """
+    In-memory index of the model items, used to filter the file list by text, status and published file type
+    without going through the rendered text of every row.
+
+    The words of the searchable fields are indexed by trigram, so a search term is only compared to the words
+    sharing its trigrams instead of every item, while the items are grouped by status and by type in bitsets.
+    Each item is given a slot, which is the position of its bit in the bitsets and the id used in the word index.
+    """
+
+    def __init__(self):
+        """Class constructor"""
+
+        self._slots = {}
+        self._items = []
+        self._free_slots = []
+        # words, status and type name indexed for each slot, so they can be removed from the index
+        self._slot_keys = []
+
+        self._token_slots = {}
+        self._trigram_tokens = {}
+        self._status_bits = {}
+        self._type_bits = {}
+        self._type_counts = {}
+
+        # incremented every time the index changes, so the search results can be cached
+        self.version = 0
+
+    def __len__(self):
+        """Return the number of indexed items"""
+        return len(self._slots)
+
+    @property
+    def type_names(self):
+        """Sorted list of the published file type names of the indexed items."""
+        return sorted(
+            name for name, count in self._type_counts.items() if name and count
+        )
+
+    def add(self, item):
+        """
+        Add an item to the index. If the item is already indexed, its entry is updated.
+
+        :param item: Model item holding the published file as *sg_data* and its status as *status*
+        """
+
+        if item in self._slots:
+            self.update(item)
+            return
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._items[slot] = item
+        else:
+            slot = len(self._items)
+            self._items.append(item)
+            self._slot_keys.append(None)
+        self._slots[item] = slot
+        self._index_slot(slot, item)
+        self.version += 1
+
+    def update(self, item):
+        """
+        Update the entry of an item, for example when its published file or its status has changed.
+
+        :param item: The indexed item
+        """
+
+        slot = self._slots.get(item)
+        if slot is None:
+            self.add(item)
+            return
+
+        publish_type = item.sg_data.get("published_file_type") or {}
+        if self._slot_keys[slot] == (
+            get_search_tokens(item.sg_data),
+            item.status,
+            publish_type.get("name"),
+        ):
+            return
+        self._unindex_slot(slot)
+        self._index_slot(slot, item)
+        self.version += 1
+
+    def update_status(self, item):
+        """
+        Update the status of an item, without indexing its published file again.
+
+        :param item: The indexed item
+        """
+
+        slot = self._slots.get(item)
+        if slot is None:
+            return
+
+        tokens, status, type_name = self._slot_keys[slot]
+        if status == item.status:
+            return
+        if status is not None:
+            _clear_bit(self._status_bits[status], slot)
+        if item.status is not None:
+            _set_bit(self._status_bits.setdefault(item.status, bytearray()), slot)
+        self._slot_keys[slot] = (tokens, item.status, type_name)
+        self.version += 1
+
+    def remove(self, item):
+        """
+        Remove an item from the index.
+
+        :param item: The indexed item
+        """
+
+        slot = self._slots.pop(item, None)
+        if slot is None:
+            return
+        self._unindex_slot(slot)
+        self._items[slot] = None
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+        self.version += 1
+
+    def search(self, text="", statuses=None, type_names=None):
+        """
+        Find the items matching a filter.
+
+        :param text:       Text the items must match. Each word of the text must be found in one of the searchable
+                           fields of the published file, at any position.
+        :param statuses:   List of the statuses the items must have, None to accept all the statuses
+        :param type_names: List of the published file types the items must have, None to accept all the types
+        :returns: The set of the matching items
+        """
+
+        slots = None
+        for term in set(tokenize(text)):
+            term_slots = set()
+            for token in self._match_tokens(term):
+                term_slots.update(self._token_slots[token])
+            slots = term_slots if slots is None else slots & term_slots
+            if not slots:
+                return set()
+
+        mask = None
+        if statuses is not None:
+            mask = _union_bits(self._status_bits, statuses)
+        if type_names is not None:
+            type_mask = _union_bits(self._type_bits, type_names)
+            mask = type_mask if mask is None else mask & type_mask
+
+        if slots is None:
+            if mask is None:
+                return set(self._slots)
+            return set(self._items[slot] for slot in _iter_bits(mask))
+
+        if mask is not None:
+            mask_bytes = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+            slots = [
+                slot
+                for slot in slots
+                if slot >> 3 < len(mask_bytes)
+                and mask_bytes[slot >> 3] >> (slot & 7) & 1
+            ]
+        return set(self._items[slot] for slot in slots)
+
+    def _match_tokens(self, term):
+        """Get the indexed words containing the given search term"""
+
+        trigrams = get_trigrams(term)
+        if not trigrams:
+            # the term is too short to use the trigrams, compare it to the whole vocabulary, which is usually much
+            # smaller than the number of items
+            return [token for token in self._token_slots if term in token]
+
+        candidates = None
+        for trigram in sorted(
+            trigrams, key=lambda t: len(self._trigram_tokens.get(t, ()))
+        ):
+            tokens = self._trigram_tokens.get(trigram)
+            if not tokens:
+                return []
+            candidates = set(tokens) if candidates is None else candidates & tokens
+        # sharing all the trigrams doesn't mean the term is part of the word, make sure it is
+        return [token for token in candidates if term in token]
+
+    def _index_slot(self, slot, item):
+        """Index the words, status and type of an item"""
+
+        tokens = get_search_tokens(item.sg_data)
+        for token in tokens:
+            token_slots = self._token_slots.get(token)
+            if token_slots is None:
+                token_slots = self._token_slots[token] = set()
+                for trigram in get_trigrams(token):
+                    self._trigram_tokens.setdefault(trigram, set()).add(token)
+            token_slots.add(slot)
+
+        if item.status is not None:
+            _set_bit(self._status_bits.setdefault(item.status, bytearray()), slot)
+
+        type_name = (item.sg_data.get("published_file_type") or {}).get("name")
+        _set_bit(self._type_bits.setdefault(type_name, bytearray()), slot)
+        self._type_counts[type_name] = self._type_counts.get(type_name, 0) + 1
+
+        self._slot_keys[slot] = (tokens, item.status, type_name)
+
+    def _unindex_slot(self, slot):
+        """Remove the words, status and type of an item from the index"""
+
+        tokens, status, type_name = self._slot_keys[slot]
+        for token in tokens:
+            token_slots = self._token_slots[token]
+            token_slots.discard(slot)
+            if token_slots:
+                continue
+            # the word isn't used anymore, forget about it
+            del self._token_slots[token]
+            for trigram in get_trigrams(token):
+                trigram_tokens = self._trigram_tokens[trigram]
+                trigram_tokens.discard(token)
+                if not trigram_tokens:
+                    del self._trigram_tokens[trigram]
+
+        if status is not None:
+            _clear_bit(self._status_bits[status], slot)
+        _clear_bit(self._type_bits[type_name], slot)
+        self._type_counts[type_name] -= 1
+
+
+def _set_bit(bits, slot):
+    """Set the bit of a slot in a bitset stored as a bytearray, growing the bytearray if needed"""
+    byte = slot >> 3
+    if byte >= len(bits):
+        bits.extend(bytes(byte - len(bits) + 1))
+    bits[byte] |= 1 << (slot & 7)
+
+
+def _clear_bit(bits, slot):
+    """Clear the bit of a slot in a bitset stored as a bytearray"""
+    byte = slot >> 3
+    if byte < len(bits):
+        bits[byte] &= ~(1 << (slot & 7)) & 0xFF
+
+
+def _union_bits(bitsets, keys):
+    """Return the union of the bitsets matching the given keys, as an integer"""
+    mask = 0
+    for key in keys:
+        bits = bitsets.get(key)
+        if bits:
+            mask |= int.from_bytes(bits, "little")
+    return mask
+
+
+def _iter_bits(mask):
+    """Return the list of the slots whose bit is set in the given integer bitset"""
+    return [slot for slot, bit in enumerate(bin(mask)[:1:-1]) if bit == "1"]
@@ -0,0 +1,110 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from sgtk.platform.qt import QtCore
+
+from .model import FileModel
+
+
+class ThumbnailLoader(QtCore.QObject):
+    """
+    Load the thumbnails of the items visible in a view, as well as a few rows around them, instead of loading the
+    thumbnails of all the items of the model.
+
+    The visible rows are requested first, and the pending requests of the rows which have been scrolled away are
+    cancelled.
+    """
+
+    def __init__(self, view, model, prefetch_margin=20):
+        """
+        Class constructor.
+
+        :param view:            The :class:`sgtk.platform.qt.QtGui.QTreeView` displaying the model
+        :param model:           The :class:`FileModel` to load the thumbnails for
+        :param prefetch_margin: Number of rows above and below the visible ones to load the thumbnails for
+        """
+
+        QtCore.QObject.__init__(self, view)
+
+        self._view = view
+        self._model = model
+        self._prefetch_margin = prefetch_margin
+
+        # all the view and model changes are compressed into a single update, run once the events are processed
+        self._update_timer = QtCore.QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        self._update_timer.timeout.connect(self.update)
+
+        self._view.verticalScrollBar().valueChanged.connect(self._schedule_update)
+        self._view.expanded.connect(self._schedule_update)
+        self._view.collapsed.connect(self._schedule_update)
+        self._view.viewport().installEventFilter(self)
+        self._model.rowsInserted.connect(self._schedule_update)
+        self._model.rowsRemoved.connect(self._schedule_update)
+        self._model.layoutChanged.connect(self._schedule_update)
+        self._model.modelReset.connect(self._schedule_update)
+
+    def eventFilter(self, obj, event):
+        """
+        Override the :class:`sgtk.platform.qt.QtCore.QObject` method to update the thumbnails when the view is
+        resized.
+        """
+        if event.type() == QtCore.QEvent.Resize:
+            self._schedule_update()
+        return False
+
+    def update(self):
+        """Request the thumbnails of the visible rows and the rows around them"""
+
+        if self._view.model() is None:
+            return
+
+        viewport_height = self._view.viewport().height()
+        first_index = self._view.indexAt(QtCore.QPoint(0, 0))
+        if not first_index.isValid():
+            first_index = self._view.model().index(0, 0)
+
+        visible = []
+        index = first_index
+        while index.isValid() and self._view.visualRect(index).top() < viewport_height:
+            visible.append(index)
+            index = self._view.indexBelow(index)
+
+        below = []
+        while index.isValid() and len(below) < self._prefetch_margin:
+            below.append(index)
+            index = self._view.indexBelow(index)
+
+        above = []
+        index = self._view.indexAbove(first_index) if first_index.isValid() else None
+        while index and index.isValid() and len(above) < self._prefetch_margin:
+            above.append(index)
+            index = self._view.indexAbove(index)
+
+        items = []
+        for index in visible + below + above:
+            item = self._model.item_from_index(self._map_to_source(index))
+            if isinstance(item, FileModel.FileItem):
+                items.append(item)
+        self._model.request_thumbnails(items)
+
+    def _schedule_update(self, *args):
+        """Schedule an update of the thumbnails once the pending events are processed"""
+        self._update_timer.start()
+
+    def _map_to_source(self, index):
+        """Map an index of the view to the file model, as the view may use a proxy model"""
+
+        model = index.model()
+        while model is not None and model is not self._model:
+            index = model.mapToSource(index)
+            model = index.model()
+        return index
@@ -33,9 +33,51 @@ class Ui_Dialog(object):
         self.presets.setSizePolicy(sizePolicy)
         self.presets.setObjectName("presets")
         self.preset_layout.addWidget(self.presets)
+        self.extra_presets_button = QtGui.QToolButton(Dialog)
+        self.extra_presets_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self.extra_presets_button.setObjectName("extra_presets_button")
+        self.preset_layout.addWidget(self.extra_presets_button)
         spacerItem = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.preset_layout.addItem(spacerItem)
+        self.refresh_button = QtGui.QPushButton(Dialog)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.refresh_button.sizePolicy().hasHeightForWidth())
+        self.refresh_button.setSizePolicy(sizePolicy)
+        self.refresh_button.setObjectName("refresh_button")
+        self.preset_layout.addWidget(self.refresh_button)
         self.verticalLayout.addLayout(self.preset_layout)
+        self.filter_layout = QtGui.QHBoxLayout()
+        self.filter_layout.setObjectName("filter_layout")
+        self.filter_text = QtGui.QLineEdit(Dialog)
+        self.filter_text.setObjectName("filter_text")
+        self.filter_layout.addWidget(self.filter_text)
+        self.status_filter = QtGui.QComboBox(Dialog)
+        self.status_filter.setSizeAdjustPolicy(QtGui.QComboBox.AdjustToContents)
+        self.status_filter.setObjectName("status_filter")
+        self.filter_layout.addWidget(self.status_filter)
+        self.type_filter = QtGui.QComboBox(Dialog)
+        self.type_filter.setSizeAdjustPolicy(QtGui.QComboBox.AdjustToContents)
+        self.type_filter.setObjectName("type_filter")
+        self.filter_layout.addWidget(self.type_filter)
+        self.check_button = QtGui.QPushButton(Dialog)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.check_button.sizePolicy().hasHeightForWidth())
+        self.check_button.setSizePolicy(sizePolicy)
+        self.check_button.setObjectName("check_button")
+        self.filter_layout.addWidget(self.check_button)
+        self.uncheck_button = QtGui.QPushButton(Dialog)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.uncheck_button.sizePolicy().hasHeightForWidth())
+        self.uncheck_button.setSizePolicy(sizePolicy)
+        self.uncheck_button.setObjectName("uncheck_button")
+        self.filter_layout.addWidget(self.uncheck_button)
+        self.verticalLayout.addLayout(self.filter_layout)
         self.view = QtGui.QTreeView(Dialog)
         self.view.setEditTriggers(QtGui.QAbstractItemView.CurrentChanged|QtGui.QAbstractItemView.SelectedClicked)
         self.view.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
@@ -45,8 +87,24 @@ class Ui_Dialog(object):
         self.verticalLayout.addWidget(self.view)
         self.button_layout = QtGui.QHBoxLayout()
         self.button_layout.setObjectName("button_layout")
+        self.build_status = QtGui.QLabel(Dialog)
+        self.build_status.setText("")
+        self.build_status.setObjectName("build_status")
+        self.button_layout.addWidget(self.build_status)
         spacerItem1 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.button_layout.addItem(spacerItem1)
+        self.build_progress = QtGui.QProgressBar(Dialog)
+        self.build_progress.setProperty("value", 0)
+        self.build_progress.setObjectName("build_progress")
+        self.button_layout.addWidget(self.build_progress)
+        self.cancel_button = QtGui.QPushButton(Dialog)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.cancel_button.sizePolicy().hasHeightForWidth())
+        self.cancel_button.setSizePolicy(sizePolicy)
+        self.cancel_button.setObjectName("cancel_button")
+        self.button_layout.addWidget(self.cancel_button)
         self.build_button = QtGui.QPushButton(Dialog)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -63,6 +121,16 @@ class Ui_Dialog(object):
     def retranslateUi(self, Dialog):
         Dialog.setWindowTitle(QtGui.QApplication.translate("Dialog", "Dialog", None, QtGui.QApplication.UnicodeUTF8))
         self.preset_label.setText(QtGui.QApplication.translate("Dialog", "Presets:", None, QtGui.QApplication.UnicodeUTF8))
+        self.extra_presets_button.setToolTip(QtGui.QApplication.translate("Dialog", "Select other presets to load and build along with this one", None, QtGui.QApplication.UnicodeUTF8))
+        self.extra_presets_button.setText(QtGui.QApplication.translate("Dialog", "+", None, QtGui.QApplication.UnicodeUTF8))
+        self.refresh_button.setToolTip(QtGui.QApplication.translate("Dialog", "Only retrieve the published files created or updated since the last load", None, QtGui.QApplication.UnicodeUTF8))
+        self.refresh_button.setText(QtGui.QApplication.translate("Dialog", "Refresh", None, QtGui.QApplication.UnicodeUTF8))
+        self.filter_text.setPlaceholderText(QtGui.QApplication.translate("Dialog", "Filter by entity, name, type or version", None, QtGui.QApplication.UnicodeUTF8))
+        self.check_button.setToolTip(QtGui.QApplication.translate("Dialog", "Check the files matching the filter", None, QtGui.QApplication.UnicodeUTF8))
+        self.check_button.setText(QtGui.QApplication.translate("Dialog", "Check All", None, QtGui.QApplication.UnicodeUTF8))
+        self.uncheck_button.setToolTip(QtGui.QApplication.translate("Dialog", "Uncheck the files matching the filter", None, QtGui.QApplication.UnicodeUTF8))
+        self.uncheck_button.setText(QtGui.QApplication.translate("Dialog", "Uncheck All", None, QtGui.QApplication.UnicodeUTF8))
+        self.cancel_button.setText(QtGui.QApplication.translate("Dialog", "Cancel", None, QtGui.QApplication.UnicodeUTF8))
         self.build_button.setText(QtGui.QApplication.translate("Dialog", "Build", None, QtGui.QApplication.UnicodeUTF8))
 
 from . import resources_rc
@@ -15,8 +15,58 @@ REGEX_PATTERN = r"{context.(\w+)(.(\w+))*}"
 ENTITY_LIST = ["project", "entity", "step", "task"]
 FIELD_LIST = ["id", "name"]
 
+# separator used to name a combination of presets
+PRESET_NAME_SEPARATOR = " + "
 
-def resolve_filters(filters):
+
+def get_preset_name(preset_names):
+    """
+    Get the name of a preset, or of a combination of presets.
+
+    :param preset_names: Name of a preset, or list of preset names
+    :returns: The name of the preset or of the combination
+    """
+    if isinstance(preset_names, str):
+        return preset_names
+    names = []
+    for name in preset_names:
+        if name not in names:
+            names.append(name)
+    return PRESET_NAME_SEPARATOR.join(names)
+
+
+def combine_presets(presets, preset_names):
+    """
+    Get the preset to use to load or build one or several presets together.
+
+    The actions of the presets are concatenated in the order the presets are given, which is also their order of
+    precedence: when several actions match the same published file, the file is loaded using the first one.
+
+    :param presets:      List of presets, as defined in the app settings
+    :param preset_names: Name of a preset, or list of preset names
+    :returns: The preset, or a new preset combining the given ones. None if one of the presets doesn't exist.
+    """
+
+    if isinstance(preset_names, str):
+        preset_names = [preset_names]
+    presets_by_name = dict((p["name"], p) for p in presets)
+
+    names = []
+    for name in preset_names:
+        if name not in presets_by_name:
+            return None
+        if name not in names:
+            names.append(name)
+
+    if len(names) == 1:
+        return presets_by_name[names[0]]
+    return {
+        "name": get_preset_name(names),
+        "actions": [a for name in names for a in presets_by_name[name]["actions"]],
+    }
+
+
+def resolve_filters(filters, context=None):
     """
     When passed a list of filters, it will resolve strings found in the filters using the context.
     For example: '{context.user}' could get resolved to {'type': 'HumanUser', 'id': 86, 'name': 'Philip Scadding'}
@@ -24,17 +74,19 @@ def resolve_filters(filters):
     :param filters: A list of filters that has usually be defined by the user or by default in the environment yml
     config or the app's info.yml. Supports complex filters as well. Filters should be passed in the following format:
     [[task_assignees, is, '{context.user}'],[sg_status_list, not_in, [fin,omt]]]
+    :param context: The context used to resolve the filters. If None, the current context is used.
 
     :return: A List of filters for use with the shotgun api
     """
-    app = sgtk.platform.current_bundle()
+    if context is None:
+        context = sgtk.platform.current_bundle().context
 
     resolved_filters = []
     for filter in filters:
         if type(filter) is dict:
             resolved_filter = {
                 "filter_operator": filter["filter_operator"],
-                "filters": resolve_filters(filter["filters"]),
+                "filters": resolve_filters(filter["filters"], context),
             }
         else:
             resolved_filter = []
@@ -43,9 +95,9 @@ def resolve_filters(filters):
                 if m:
                     if m.group(1) in ENTITY_LIST:
                         if not m.group(3):
-                            field = getattr(app.context, m.group(1))
+                            field = getattr(context, m.group(1))
                         elif m.group(3) and m.group(3) in FIELD_LIST:
-                            field = getattr(app.context, m.group(1), {}).get(m.group(3))
+                            field = getattr(context, m.group(1), {}).get(m.group(3))
                 resolved_filter.append(field)
         resolved_filters.append(resolved_filter)
     return resolved_filters